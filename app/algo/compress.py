@@ -0,0 +1,107 @@
+# app/algo/compress.py
+import lzma, zlib
+from app.utils.telemetry import timed
+
+try:
+    import zstandard as _zstd  # opsional; tanpa paket ini codec "zstd" ditolak
+except ImportError:
+    _zstd = None
+
+# id codec disimpan di 2 bit flags header pack (v3); 0 = tidak dikompresi
+NONE, ZLIB, LZMA, ZSTD = 0, 1, 2, 3
+CODECS = {"none": NONE, "zlib": ZLIB, "lzma": LZMA, "zstd": ZSTD}
+NAMES = {v: k for k, v in CODECS.items()}
+LEVELS = {ZLIB: (1, 9, 6), LZMA: (0, 9, 6), ZSTD: (1, 22, 3)}  # (min, max, default)
+
+_PROBE_BYTES = 64 << 10
+_ZSTD_WRITE_SIZE = 64 << 10
+_PROBE_RATIO = 0.9
+
+def available(codec: int) -> bool:
+    return codec != ZSTD or _zstd is not None
+
+def level_for(codec: int, level=None) -> int:
+    """Level default codec kalau None; ValueError kalau di luar rentang codec."""
+    if codec == NONE:
+        return 0
+    lo, hi, default = LEVELS[codec]
+    if level is None:
+        return default
+    if not lo <= level <= hi:
+        raise ValueError(f"{NAMES[codec]} level must be {lo}..{hi}")
+    return level
+
+def _compress(data: bytes, codec: int, level: int) -> bytes:
+    if codec == ZLIB:
+        return zlib.compress(data, level)
+    if codec == LZMA:
+        return lzma.compress(data, preset=level)
+    return _zstd.ZstdCompressor(level=level).compress(data)
+
+def worth_it(data: bytes) -> bool:
+    """Tebakan murah untuk mode auto: kompres 64 KB pertama dengan zlib level 1."""
+    head = data[:_PROBE_BYTES]
+    return bool(head) and len(zlib.compress(head, 1)) < len(head) * _PROBE_RATIO
+
+@timed("compress")
+def compress(data: bytes, codec: int, level: int) -> tuple[bytes, int]:
+    """Return (data, codec yang dipakai); jatuh ke NONE kalau hasil tidak lebih kecil."""
+    if codec == NONE or not data:
+        return data, NONE
+    out = _compress(data, codec, level)
+    if len(out) >= len(data):
+        return data, NONE
+    return out, codec
+
+class _Sink:
+    """Tujuan stream_writer zstd: tiap potongan output langsung dihitung ke batas Decompressor,
+    jadi dekompresi berhenti di potongan pertama yang melewati batas."""
+
+    def __init__(self, owner: "Decompressor"):
+        self._owner = owner
+        self.chunks = []
+
+    def write(self, data) -> int:
+        self.chunks.append(self._owner._take(bytes(data)))
+        return len(data)
+
+class Decompressor:
+    """Dekompresi inkremental per chunk; output total dibatasi `limit` byte (anti zip bomb)."""
+
+    def __init__(self, codec: int, limit: int):
+        if codec == ZLIB:
+            self._d = zlib.decompressobj()
+        elif codec == LZMA:
+            self._d = lzma.LZMADecompressor()
+        elif codec == ZSTD:
+            if _zstd is None:
+                raise ValueError("zstd payload but zstandard is not installed")
+            # decompressobj zstd tidak punya max_length: output ditarik per potongan write_size
+            self._sink = _Sink(self)
+            self._d = _zstd.ZstdDecompressor().stream_writer(self._sink, write_size=_ZSTD_WRITE_SIZE)
+        else:
+            raise ValueError(f"unknown compression codec {codec}")
+        self._codec = codec
+        self._left = limit
+
+    def _take(self, out: bytes) -> bytes:
+        self._left -= len(out)
+        if self._left < 0:
+            raise ValueError("decompressed data larger than header size")
+        return out
+
+    def update(self, data) -> bytes:
+        if self._codec == ZSTD:
+            self._d.write(data)
+            out = b"".join(self._sink.chunks)
+            self._sink.chunks.clear()
+            return out
+        # max_length: berhenti tepat setelah melewati batas, sisa input tidak diproses
+        return self._take(self._d.decompress(data, self._left + 1))
+
+    def finish(self) -> bytes:
+        out = self._d.flush() if self._codec == ZLIB else b""
+        self._take(out)
+        if self._codec in (ZLIB, LZMA) and not self._d.eof:
+            raise ValueError("truncated compressed stream")
+        return out
@@ -1,18 +1,34 @@
 # app/algo/crypto.py
-def _kstream(key: str):
+import numpy as np
+from app.utils.telemetry import timed
+
+def _key_bytes(key: str) -> np.ndarray:
     kb = key.encode("utf-8")
     if not kb: raise ValueError("empty key")
-    while True:
-        for b in kb:
-            yield b
+    return np.frombuffer(kb, dtype=np.uint8)
+
+class Vig256:
+    """Extended Vigenère (mod 256) inkremental; offset key dibawa antar chunk."""
+
+    def __init__(self, key: str, decrypt: bool = False):
+        self._kb = _key_bytes(key)
+        self._decrypt = decrypt
+        self._pos = 0
+
+    def update(self, data) -> bytes:
+        n = len(data)
+        if n == 0:
+            return b""
+        klen = self._kb.size
+        # rotasi key supaya chunk berikutnya lanjut dari offset yang sama
+        ks = np.tile(np.roll(self._kb, -(self._pos % klen)), -(-n // klen))[:n]
+        x = np.frombuffer(data, dtype=np.uint8)
+        out = np.subtract(x, ks) if self._decrypt else np.add(x, ks)  # uint8 wrap = mod 256
+        self._pos += n
+        return out.tobytes()
 
+@timed("vig256")
 def vig256(data: bytes, key: str, decrypt: bool=False) -> bytes:
-    out = bytearray(len(data))
-    ks = _kstream(key)
-    if decrypt:
-        for i, x in enumerate(data):
-            out[i] = (x - next(ks)) % 256
-    else:
-        for i, x in enumerate(data):
-            out[i] = (x + next(ks)) % 256
-    return bytes(out)
+    if not data:
+        return b""
+    return Vig256(key, decrypt).update(data)
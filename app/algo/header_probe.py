@@ -0,0 +1,61 @@
+# app/algo/header_probe.py
+from typing import Optional, Tuple
+import numpy as np
+from app.algo import pack
+from app.algo.stego_lsb import _pcm_to_stream, _ring, extract
+from app.utils.telemetry import timed
+
+# magic + ver + flags + size + name_len + name(<=255) + crc32 (+ v3: block_log2 + salt + tag
+# + raw_size kalau dikompresi), lihat pack.build; tabel CRC blok v3 tidak ikut dibaca di sini
+HEADER_MAX_BYTES = 4 + 1 + 1 + 8 + 1 + 255 + 4 + 1 + 8 + 8 + 8
+PROBE_BYTES = 6  # magic + ver + flags
+_PROBE_BITS = PROBE_BYTES * 8
+
+def _gather_index() -> Tuple[np.ndarray, np.ndarray]:
+    """Untuk tiap kandidat nlsb (baris), posisi (sampel, kolom bit) dari bit ke-j stream."""
+    j = np.arange(_PROBE_BITS)
+    rows = np.empty((8, _PROBE_BITS), dtype=np.intp)
+    cols = np.empty((8, _PROBE_BITS), dtype=np.intp)
+    for k in range(1, 9):
+        rows[k - 1] = j // k
+        cols[k - 1] = 8 - k + j % k
+    return rows, cols
+
+_ROWS, _COLS = _gather_index()
+_MAGIC = np.frombuffer(pack.MAGIC, dtype=np.uint8)
+
+def candidates(pcm: np.ndarray, start: int = 0) -> np.ndarray:
+    """nlsb (1..8) yang 6 byte pertamanya berisi MAGIC, versi dikenal, dan nlsb di flags cocok."""
+    stream = _pcm_to_stream(pcm)
+    head = _ring(stream, start, min(_PROBE_BITS, stream.size))
+    low = np.zeros(_PROBE_BITS, dtype=np.uint8)
+    low[:head.size] = head.astype(np.uint8)
+    bits = np.unpackbits(low.reshape(-1, 1), axis=1)
+    heads = np.packbits(bits[_ROWS, _COLS], axis=1)  # (8, PROBE_BYTES), semua kandidat sekaligus
+
+    nlsb = np.arange(1, 9)
+    ver, flags = heads[:, 4], heads[:, 5]
+    flag_nlsb = np.where(ver == 1, (flags >> 2) & 0b11, (flags >> 2) & 0b111) + 1
+    ok = (heads[:, :4] == _MAGIC).all(axis=1) & (ver >= 1) & (ver <= 3) & (flag_nlsb == nlsb)
+    return nlsb[ok]
+
+@timed("probe_header")
+def probe(pcm: np.ndarray, start: int = 0) -> Optional[Tuple[pack.Header, int, int]]:
+    """Cari header BTFY di offset `start` (melingkar ke awal stream seperti random_start).
+    Return (header, consumed, nlsb) atau None.
+
+    consumed sudah termasuk tabel CRC blok v3 (belum dibaca; header.block_crcs kosong),
+    jadi consumed + header.size = panjang payload lengkap yang perlu di-extract.
+    """
+    avail = _pcm_to_stream(pcm).size
+    for nlsb in candidates(pcm, start):
+        nlsb = int(nlsb)
+        total_bits = min(HEADER_MAX_BYTES * 8, avail * nlsb)
+        raw = extract(pcm, nlsb=nlsb, key="", random_start=False, total_bits=total_bits, start_hint=start)
+        try:
+            hdr, consumed, table = pack.parse_prefix(raw)
+        except Exception:
+            continue
+        if hdr.nlsb == nlsb:
+            return hdr, consumed + table, nlsb
+    return None
@@ -1,45 +1,174 @@
 # app/algo/id3_tags.py
-import tempfile, os
-from typing import Optional
+import io, os, shutil, struct
+from typing import Iterator, Optional
 from mutagen.id3 import ID3, ID3NoHeaderError, PRIV
+from app.utils.telemetry import timed
 
 OWNER = "bitify"
 
+_UNSYNC = 0x80
+_EXTENDED = 0x40
+_FOOTER = 0x10
+
+class _Unsupported(Exception):
+    """Tag yang tidak bisa dibaca langsung (v2.2, unsync, frame terkompresi) -> mutagen."""
+
+def _synchsafe(b) -> int:
+    return (b[0] << 21) | (b[1] << 14) | (b[2] << 7) | b[3]
+
+def _to_synchsafe(n: int) -> bytes:
+    if n >= 1 << 28:
+        raise ValueError("ID3 tag too large")
+    return bytes(((n >> 21) & 0x7F, (n >> 14) & 0x7F, (n >> 7) & 0x7F, n & 0x7F))
+
+def _tag(mv: memoryview) -> Optional[tuple[int, int, int, int]]:
+    """(versi mayor, flags, awal frame, akhir tag) untuk tag ID3v2 di awal buffer."""
+    if len(mv) < 10 or mv[:3] != b"ID3":
+        return None
+    major, flags = mv[3], mv[5]
+    end = 10 + _synchsafe(mv[6:10]) + (10 if flags & _FOOTER else 0)
+    if major not in (3, 4) or flags & _UNSYNC:
+        raise _Unsupported
+    start = 10
+    if flags & _EXTENDED:
+        if major == 4:
+            start += _synchsafe(mv[10:14])
+        else:
+            start += 4 + struct.unpack_from(">I", mv, 10)[0]
+    return major, flags, start, min(end, len(mv))
+
+def _frames(mv: memoryview, major: int, start: int, end: int) -> Iterator[tuple[bytes, int, int, int]]:
+    """(frame id, awal frame, awal isi, akhir frame) sampai padding / akhir tag."""
+    pos = start
+    while pos + 10 <= end:
+        fid = bytes(mv[pos:pos + 4])
+        if fid == b"\0\0\0\0":
+            return  # padding
+        if not all(48 <= c <= 57 or 65 <= c <= 90 for c in fid):
+            raise _Unsupported
+        size = _synchsafe(mv[pos + 4:pos + 8]) if major == 4 else struct.unpack_from(">I", mv, pos + 4)[0]
+        body = pos + 10
+        if body + size > end:
+            raise _Unsupported
+        yield fid, pos, body, body + size
+        pos = body + size
+
+def _priv_owner(mv: memoryview, body: int, stop: int, owner: str) -> Optional[memoryview]:
+    payload = mv[body:stop]
+    nul = bytes(payload[:256]).find(b"\0")
+    if nul < 0 or bytes(payload[:nul]).decode("latin-1") != owner:
+        return None
+    return payload[nul + 1:]
+
+def _frame_flags(mv: memoryview, pos: int) -> int:
+    return struct.unpack_from(">H", mv, pos + 8)[0]
+
+def _opaque(major: int, flags: int) -> bool:
+    # v2.3: compression 0x0080, encryption 0x0040; v2.4: compression 0x0008,
+    # encryption 0x0004, unsync 0x0002, data length indicator 0x0001
+    return bool(flags & (0x00C0 if major == 3 else 0x000F))
+
+@timed("read_priv")
+def read_priv(mp3_bytes: bytes, owner: str = OWNER) -> Optional[bytes]:
+    """Cari frame PRIV milik `owner` langsung dari header tag; audio tidak disentuh."""
+    mv = memoryview(mp3_bytes).cast("B")
+    try:
+        tag = _tag(mv)
+        if tag is None:
+            return None
+        major, _, start, end = tag
+        for fid, pos, body, stop in _frames(mv, major, start, end):
+            if fid != b"PRIV":
+                continue
+            if _opaque(major, _frame_flags(mv, pos)):
+                raise _Unsupported
+            data = _priv_owner(mv, body, stop, owner)
+            if data is not None:
+                return bytes(data)
+        return None
+    except _Unsupported:
+        return _read_priv_mutagen(mp3_bytes, owner)
+
+def _priv_tag(mv: memoryview, data: bytes, owner: str) -> tuple[list, int]:
+    """Potongan tag baru (header + frame lama + PRIV baru) dan offset awal audio di buffer lama."""
+    tag = _tag(mv)
+    if tag is None:
+        major, kept, audio = 3, [], 0
+    else:
+        major, _, start, end = tag
+        kept = []
+        for fid, pos, body, stop in _frames(mv, major, start, end):
+            if fid == b"PRIV":
+                if _opaque(major, _frame_flags(mv, pos)):
+                    raise _Unsupported
+                if _priv_owner(mv, body, stop, owner) is not None:
+                    continue
+            kept.append(mv[pos:stop])
+        audio = end
+
+    content = owner.encode("latin-1") + b"\0" + data
+    size = _to_synchsafe(len(content)) if major == 4 else struct.pack(">I", len(content))
+    frame = b"PRIV" + size + b"\0\0"
+    body_len = sum(len(k) for k in kept) + len(frame) + len(content)
+    header = b"ID3" + bytes((major, 0, 0)) + _to_synchsafe(body_len)
+    return [header, *kept, frame, content], audio
+
+@timed("write_priv")
 def write_priv(mp3_bytes: bytes, data: bytes, owner: str = OWNER) -> bytes:
-    with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as f:
-        f.write(mp3_bytes)
-        path = f.name
+    """Pasang PRIV baru: tag lama disusun ulang di memori, audio disambung dari memoryview."""
+    mv = memoryview(mp3_bytes).cast("B")
     try:
+        parts, audio = _priv_tag(mv, data, owner)
+    except _Unsupported:
+        return _write_priv_mutagen(mp3_bytes, data, owner)
+    return b"".join([*parts, mv[audio:]])
+
+@timed("write_priv")
+def write_priv_file(src_path: str, dst_path: str, data: bytes, owner: str = OWNER) -> None:
+    """Versi file dari write_priv untuk output streaming: audio disalin per chunk, tidak dimuat utuh."""
+    with open(src_path, "rb") as src:
+        size = os.fstat(src.fileno()).st_size
+        head = src.read(min(size, 10))
+        if head[:3] == b"ID3" and len(head) == 10:
+            head += src.read(_synchsafe(head[6:10]) + 10)  # seluruh tag (+ footer kalau ada)
         try:
-            id3 = ID3(path)
-        except ID3NoHeaderError:
-            id3 = ID3()
-        for key in list(id3.keys()):
-            fr = id3.getall(key)
-            for frame in fr:
-                if isinstance(frame, PRIV) and frame.owner == owner:
-                    id3.delall(key)
-        id3.add(PRIV(owner=owner, data=data))
-        id3.save(path, v2_version=3)
-        with open(path, "rb") as f2:
-            return f2.read()
-    finally:
-        try: os.remove(path)
-        except: pass
+            parts, audio = _priv_tag(memoryview(head), data, owner)
+        except _Unsupported:
+            parts, audio = None, 0
+        if parts is None:
+            shutil.copyfile(src_path, dst_path)
+            id3 = ID3(dst_path)
+            id3.delall("PRIV:" + owner)
+            id3.add(PRIV(owner=owner, data=data))
+            id3.save(dst_path, v2_version=3)
+            return
+        with open(dst_path, "wb") as dst:
+            for p in parts:
+                dst.write(p)
+            src.seek(audio)
+            shutil.copyfileobj(src, dst, 1 << 20)
 
-def read_priv(mp3_bytes: bytes, owner: str = OWNER) -> Optional[bytes]:
-    with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as f:
-        f.write(mp3_bytes)
-        path = f.name
+def _write_priv_mutagen(mp3_bytes: bytes, data: bytes, owner: str) -> bytes:
+    bio = io.BytesIO(mp3_bytes)
     try:
-        try:
-            id3 = ID3(path)
-        except ID3NoHeaderError:
-            return None
-        for frame in id3.getall("PRIV"):
+        id3 = ID3(bio)
+    except ID3NoHeaderError:
+        id3 = ID3()
+    for key in list(id3.keys()):
+        fr = id3.getall(key)
+        for frame in fr:
             if isinstance(frame, PRIV) and frame.owner == owner:
-                return bytes(frame.data)
+                id3.delall(key)
+    id3.add(PRIV(owner=owner, data=data))
+    id3.save(bio, v2_version=3)
+    return bio.getvalue()
+
+def _read_priv_mutagen(mp3_bytes: bytes, owner: str) -> Optional[bytes]:
+    try:
+        id3 = ID3(io.BytesIO(mp3_bytes))
+    except ID3NoHeaderError:
         return None
-    finally:
-        try: os.remove(path)
-        except: pass
\ No newline at end of file
+    for frame in id3.getall("PRIV"):
+        if isinstance(frame, PRIV) and frame.owner == owner:
+            return bytes(frame.data)
+    return None
@@ -0,0 +1,222 @@
+# app/algo/mp3_frames.py
+import struct
+from dataclasses import dataclass
+from typing import Optional
+from app.utils.telemetry import timed
+
+# index: [versi][layer] ; versi 3 = MPEG1, 2 = MPEG2, 0 = MPEG2.5 ; layer 3 = L1, 2 = L2, 1 = L3
+_BITRATES = {
+    (3, 3): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (3, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (3, 1): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 3): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_BITRATES[(2, 1)] = _BITRATES[(2, 2)]
+for _layer in (1, 2, 3):
+    _BITRATES[(0, _layer)] = _BITRATES[(2, _layer)]
+
+_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+# encoder yang tag LAME-nya dipakai ffmpeg untuk trim gapless (delay/padding)
+_GAPLESS_ENCODERS = (b"LAME", b"Lavf", b"Lavc")
+
+@dataclass
+class FrameHeader:
+    version: int
+    layer: int
+    sample_rate: int
+    channels: int
+    length: int
+    samples: int
+
+@dataclass
+class StreamInfo:
+    sample_rate: int
+    channels: int
+    samples: int      # sampel per channel setelah decode (= len(pcm) dari decode_to_pcm)
+    frames: int
+    source: str       # "xing", "vbri", atau "scan"
+
+def _parse_header(buf, pos: int) -> Optional[FrameHeader]:
+    if pos + 4 > len(buf):
+        return None
+    h = struct.unpack_from(">I", buf, pos)[0]
+    if (h >> 21) & 0x7FF != 0x7FF:
+        return None
+    version, layer = (h >> 19) & 3, (h >> 17) & 3
+    br_idx, sr_idx = (h >> 12) & 0xF, (h >> 10) & 3
+    if version == 1 or layer == 0 or br_idx in (0, 15) or sr_idx == 3:
+        return None  # reserved / free-format: tidak bisa dihitung tanpa decode
+    padding = (h >> 9) & 1
+    channels = 1 if (h >> 6) & 3 == 3 else 2
+    sr = _SAMPLE_RATES[version][sr_idx]
+    br = _BITRATES[(version, layer)][br_idx] * 1000
+    if layer == 3:
+        length, samples = (12 * br // sr + padding) * 4, 384
+    elif layer == 2 or version == 3:
+        length, samples = 144 * br // sr + padding, 1152
+    else:
+        length, samples = 72 * br // sr + padding, 576
+    return FrameHeader(version, layer, sr, channels, length, samples)
+
+def _skip_id3v2(buf) -> int:
+    pos = 0
+    while len(buf) >= pos + 10 and bytes(buf[pos:pos + 3]) == b"ID3":
+        b = buf[pos + 6:pos + 10]
+        size = (b[0] << 21) | (b[1] << 14) | (b[2] << 7) | b[3]
+        pos += 10 + size + (10 if buf[pos + 5] & 0x10 else 0)
+    return pos
+
+def xing_offset(fh: FrameHeader) -> int:
+    """Offset tag Xing/Info dari awal frame (setelah header + side info)."""
+    side = (32 if fh.channels == 2 else 17) if fh.version == 3 else (17 if fh.channels == 2 else 9)
+    return 4 + side
+
+def _xing_fields(buf, pos: int, fh: FrameHeader) -> Optional[tuple[int, Optional[int]]]:
+    """(jumlah frame, offset tag LAME atau None) dari frame Xing/Info, atau None."""
+    if fh.layer != 1:
+        return None
+    off = pos + xing_offset(fh)
+    if bytes(buf[off:off + 4]) not in (b"Xing", b"Info"):
+        return None
+    flags = struct.unpack_from(">I", buf, off + 4)[0]
+    if not flags & 1:
+        return None
+    frames = struct.unpack_from(">I", buf, off + 8)[0]
+    q = off + 8 + 4 + (4 if flags & 2 else 0) + (100 if flags & 4 else 0) + (4 if flags & 8 else 0)
+    if bytes(buf[q:q + 4]) in _GAPLESS_ENCODERS and q + 24 <= pos + fh.length:
+        return frames, q
+    return frames, None
+
+def _lame_pads(buf, q: int) -> tuple[int, int]:
+    v = (buf[q + 21] << 16) | (buf[q + 22] << 8) | buf[q + 23]
+    return v >> 12, v & 0xFFF
+
+# sampel yang ditambahkan decoder MP3 di depan (dikompensasi ffmpeg bersama delay encoder)
+DECODER_DELAY = 529
+
+def _gapless_trim(raw: int, start_pad: int, end_pad: int) -> tuple[int, int]:
+    """Rentang [skip, stop) sampel raw per channel yang disisakan ffmpeg dari tag LAME.
+
+    Akhir stream digeser DECODER_DELAY lalu dijepit ke panjang raw, jadi end_pad < 529
+    tidak memotong apa pun di akhir (yang dibuang hanya skip di depan).
+    """
+    skip = start_pad + DECODER_DELAY
+    stop = min(raw, raw - end_pad + DECODER_DELAY)
+    return skip, stop
+
+def _xing(buf, pos: int, fh: FrameHeader) -> Optional[tuple[int, int]]:
+    """(frame, sampel) dari header Xing/Info (+ trim LAME), atau None."""
+    found = _xing_fields(buf, pos, fh)
+    if found is None:
+        return None
+    frames, q = found
+    total = frames * fh.samples
+    if q is not None:
+        skip, stop = _gapless_trim(total, *_lame_pads(buf, q))
+        total = stop - skip
+    return frames, total
+
+def _vbri(buf, pos: int, fh: FrameHeader) -> Optional[tuple[int, int]]:
+    off = pos + 4 + 32
+    if bytes(buf[off:off + 4]) != b"VBRI":
+        return None
+    frames = struct.unpack_from(">I", buf, off + 14)[0]
+    return frames, frames * fh.samples
+
+@timed("scan_frames")
+def scan(data) -> Optional[StreamInfo]:
+    """Hitung sampel & channel MP3 dari header frame saja, tanpa decode.
+
+    Return None kalau stream ambigu (bukan MP3, free-format, sample rate /
+    channel berubah, atau sinkronisasi hilang di tengah) -> pakai ffmpeg.
+    """
+    buf = memoryview(data).cast("B")
+    pos = _skip_id3v2(buf)
+    first = _parse_header(buf, pos)
+    if first is None:
+        return None
+    nxt = _parse_header(buf, pos + first.length)
+    if nxt is None or (nxt.sample_rate, nxt.channels) != (first.sample_rate, first.channels):
+        return None  # satu header valid belum cukup untuk yakin ini MP3
+
+    for source, found in (("xing", _xing(buf, pos, first)), ("vbri", _vbri(buf, pos, first))):
+        if found is not None:
+            frames, total = found
+            return StreamInfo(first.sample_rate, first.channels, max(0, total), frames, source)
+
+    frames = 0
+    end = len(buf)
+    while pos + 4 <= end:
+        fh = _parse_header(buf, pos)
+        if fh is None:
+            tail = bytes(buf[pos:pos + 3])
+            if tail in (b"TAG", b"APE", b"LYR") or end - pos < first.length:
+                break  # tag ID3v1/APE/Lyrics di akhir, atau sisa potongan frame
+            return None
+        if (fh.sample_rate, fh.channels) != (first.sample_rate, first.channels):
+            return None
+        if pos + fh.length > end:
+            return None  # frame terakhir terpotong: ffmpeg tetap men-decode sebagian
+        frames += 1
+        pos += fh.length
+    return StreamInfo(first.sample_rate, first.channels, frames * first.samples, frames, "scan")
+
+@dataclass
+class FrameIndex:
+    sample_rate: int
+    channels: int
+    spf: int
+    offsets: list      # byte offset tiap frame audio (tanpa frame Info) + offset akhir frame terakhir
+    skip: int          # sampel raw per channel yang dibuang ffmpeg di awal (0 kalau tanpa tag gapless)
+    samples: int       # sampel per channel setelah decode (= len(pcm) dari decode_to_pcm)
+
+    @property
+    def frames(self) -> int:
+        return len(self.offsets) - 1
+
+def iter_frames(buf, pos: int = 0):
+    """(offset, FrameHeader) frame berurutan mulai `pos` sampai sinkronisasi hilang."""
+    while True:
+        fh = _parse_header(buf, pos)
+        if fh is None or pos + fh.length > len(buf):
+            return
+        yield pos, fh
+        pos += fh.length
+
+@timed("scan_frames")
+def index(data) -> Optional[FrameIndex]:
+    """Posisi byte semua frame audio + trim gapless seperti demuxer ffmpeg, untuk memotong
+    stream di batas frame. None kalau stream tidak bisa dipetakan pasti (lihat scan)."""
+    buf = memoryview(data).cast("B")
+    pos = _skip_id3v2(buf)
+    first = _parse_header(buf, pos)
+    if first is None or first.layer != 1:
+        return None
+    xing = _xing_fields(buf, pos, first)
+    if xing is None and _vbri(buf, pos, first) is not None:
+        return None  # VBRI: ffmpeg tidak memakai trim, tapi frame pertama bukan audio
+    if xing is not None:
+        pos += first.length
+    offsets = []
+    for off, fh in iter_frames(buf, pos):
+        if (fh.sample_rate, fh.channels, fh.samples) != (first.sample_rate, first.channels, first.samples):
+            return None
+        offsets.append(off)
+    if not offsets:
+        return None
+    last = _parse_header(buf, offsets[-1])
+    end = offsets[-1] + last.length
+    tail = bytes(buf[end:end + 3])
+    if end < len(buf) and tail not in (b"TAG", b"APE", b"LYR") and len(buf) - end >= first.length:
+        return None  # sinkronisasi hilang di tengah
+    offsets.append(end)
+    spf = first.samples
+    raw = (len(offsets) - 1) * spf
+    skip, stop = 0, raw
+    if xing is not None and xing[1] is not None:
+        if xing[0] != len(offsets) - 1:
+            return None
+        skip, stop = _gapless_trim(raw, *_lame_pads(buf, xing[1]))
+    return FrameIndex(first.sample_rate, first.channels, spf, offsets, skip, max(0, stop - skip))
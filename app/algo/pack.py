@@ -1,9 +1,13 @@
 # app/algo/pack.py
-import struct, zlib
-from dataclasses import dataclass
+import hashlib, hmac, os, struct, zlib
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, Optional
+from app.utils.telemetry import timed
 
 MAGIC = b"BTFY"
-VER = 2
+VER = 3
+BLOCK_LOG2 = 16  # blok 64 KB untuk CRC per blok (v3)
+_TAG_PERSON = b"btfy-keytag"
 
 @dataclass
 class Header:
@@ -13,23 +17,80 @@ class Header:
     size: int
     name: str
     crc32: int
+    # v3: tag verifikasi kunci + CRC32 plaintext per blok
+    version: int = 2
+    block_log2: int = 0
+    key_salt: bytes = b""
+    key_tag: bytes = b""
+    block_crcs: list = field(default_factory=list)
+    # v3 dengan kompresi: codec (compress.NONE/ZLIB/...) + ukuran asli; size = ukuran terkompresi
+    codec: int = 0
+    raw_size: int = 0
 
-def build(encrypt: bool, random_start: bool, nlsb: int, size: int, name: str, crc32: int) -> bytes:
-    assert 1 <= nlsb <= 8
+    @property
+    def block_size(self) -> int:
+        return 1 << self.block_log2
+
+    @property
+    def n_blocks(self) -> int:
+        return -(-self.size // self.block_size) if self.version >= 3 else 0
+
+def key_tag(key: str, salt: bytes) -> bytes:
+    """Tag 8 byte (blake2b ber-salt): menolak kunci salah tanpa membuka payload.
+
+    Bukan pertahanan brute force: CRC32 blok pertama di header yang sama (atas plaintext)
+    sudah cukup untuk menguji kandidat kunci dengan cepat, jadi tag sengaja dibuat murah.
+    """
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=8, salt=salt, person=_TAG_PERSON).digest()
+
+def check_key(hdr: Header, key: str) -> bool:
+    """True kalau payload tidak terenkripsi, header tidak punya tag (v1/v2), atau tag cocok."""
+    if hdr.version < 3 or not hdr.encrypt:
+        return True
+    return hmac.compare_digest(key_tag(key, hdr.key_salt), hdr.key_tag)
+
+def block_crcs(data: bytes, block_log2: int = BLOCK_LOG2) -> list:
+    bs = 1 << block_log2
+    mv = memoryview(data)
+    return [zlib.crc32(mv[i:i + bs]) & 0xFFFFFFFF for i in range(0, len(data), bs)]
+
+def build(encrypt: bool, random_start: bool, nlsb: int, size: int, name: str, crc32: int,
+          key: Optional[str] = None, block_crcs: Optional[list] = None, block_log2: int = BLOCK_LOG2,
+          codec: int = 0, raw_size: int = 0) -> bytes:
+    """Header v3 kalau block_crcs (dari pack.block_crcs plaintext) diberikan, selain itu layout v2.
+
+    Dengan kompresi (v3 saja): size dan block_crcs untuk data terkompresi sebelum enkripsi,
+    crc32 dan raw_size untuk file asli.
+    """
+    assert 1 <= nlsb <= 8 and 0 <= codec <= 3
+    assert not codec or block_crcs is not None
     flags = (1 if encrypt else 0) \
           | ((1 if random_start else 0) << 1) \
-          | (((nlsb - 1) & 0b111) << 2)
+          | (((nlsb - 1) & 0b111) << 2) \
+          | (codec << 5)
     name_b = name.encode("utf-8")[:255]
-    return MAGIC + struct.pack("<B", VER) + struct.pack("<B", flags) + struct.pack("<Q", size) + \
+    ver = 2 if block_crcs is None else VER
+    head = MAGIC + struct.pack("<B", ver) + struct.pack("<B", flags) + struct.pack("<Q", size) + \
             struct.pack("<B", len(name_b)) + name_b + struct.pack("<I", crc32)
+    if ver == 2:
+        return head
+    assert len(block_crcs) == -(-size // (1 << block_log2))
+    salt = os.urandom(8)
+    # tag hanya berarti untuk payload terenkripsi; tanpa enkripsi kunci tidak perlu diuji dari header
+    tag = key_tag(key or "", salt) if encrypt else bytes(8)
+    ext = struct.pack("<B", block_log2) + salt + tag
+    if codec:
+        ext += struct.pack("<Q", raw_size)
+    return head + ext + struct.pack(f"<{len(block_crcs)}I", *block_crcs)
 
-def parse(bs: bytes) -> tuple[Header, int]:
+def parse_prefix(bs: bytes) -> tuple[Header, int, int]:
+    """Header tanpa tabel CRC blok: (header, panjang prefix, panjang tabel CRC sesudahnya)."""
     assert bs[:4] == MAGIC, "bad magic"
     ver = bs[4]
     flags = bs[5]
     if ver == 1:
         nlsb = ((flags >> 2) & 0b11) + 1
-    elif ver == 2:
+    elif ver in (2, 3):
         nlsb = ((flags >> 2) & 0b111) + 1
     else:
         raise ValueError("unsupported version")
@@ -41,7 +102,43 @@ def parse(bs: bytes) -> tuple[Header, int]:
     name = bs[start:start+name_len].decode("utf-8", errors="ignore")
     crc32 = struct.unpack_from("<I", bs, start+name_len)[0]
     consumed = start + name_len + 4
-    return Header(encrypt, random_start, nlsb, size, name, crc32), consumed
+    hdr = Header(encrypt, random_start, nlsb, size, name, crc32, version=ver)
+    if ver < 3:
+        return hdr, consumed, 0
+    if len(bs) < consumed + 17:
+        raise ValueError("truncated header")
+    hdr.block_log2 = bs[consumed]
+    if not 8 <= hdr.block_log2 <= 30:
+        raise ValueError("bad block size")
+    hdr.key_salt = bytes(bs[consumed + 1:consumed + 9])
+    hdr.key_tag = bytes(bs[consumed + 9:consumed + 17])
+    consumed += 17
+    hdr.codec = (flags >> 5) & 0b11
+    if hdr.codec:
+        if len(bs) < consumed + 8:
+            raise ValueError("truncated header")
+        hdr.raw_size = struct.unpack_from("<Q", bs, consumed)[0]
+        consumed += 8
+    return hdr, consumed, 4 * hdr.n_blocks
+
+def parse(bs: bytes) -> tuple[Header, int]:
+    hdr, consumed, table = parse_prefix(bs)
+    if table:
+        if len(bs) < consumed + table:
+            raise ValueError("truncated block table")
+        hdr.block_crcs = list(struct.unpack_from(f"<{hdr.n_blocks}I", bs, consumed))
+    return hdr, consumed + table
+
+def verified_blocks(hdr: Header, chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Periksa CRC plaintext per blok (v3) sambil lewat; ValueError di blok pertama yang rusak.
+
+    `chunks` harus sudah dipotong per hdr.block_size (blok terakhir boleh lebih pendek).
+    """
+    for i, chunk in enumerate(chunks):
+        if zlib.crc32(chunk) & 0xFFFFFFFF != hdr.block_crcs[i]:
+            raise ValueError(f"block {i} CRC mismatch")
+        yield chunk
 
+@timed("crc32")
 def crc32_bytes(b: bytes) -> int:
     return zlib.crc32(b) & 0xFFFFFFFF
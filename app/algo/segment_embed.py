@@ -0,0 +1,197 @@
+# app/algo/segment_embed.py
+import os, shutil, subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+import numpy as np
+from app.algo import mp3_frames, stego_lsb, metrics, id3_tags
+from app.utils.telemetry import stage, timed
+
+# frame MP3 tambahan sebelum potongan: bit reservoir + overlap filterbank decoder/encoder
+DECODE_PREROLL = 32
+ENCODE_PREROLL = 4
+ENCODE_LOOKAHEAD = 4
+
+def _ffmpeg(cmd: list, data) -> bytes:
+    return subprocess.run(cmd, input=data, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                          check=True).stdout
+
+def plan(ix: mp3_frames.FrameIndex, segments: int) -> list:
+    """Batas segmen [a, b) dalam frame PCM hasil decode. Batas kelipatan frame MP3 dan SEG_FRAMES,
+    supaya frame encode dan segmen segmental SNR tidak terpotong antar segmen."""
+    unit = np.lcm(ix.spf, metrics.SEG_FRAMES)
+    n = ix.samples
+    per = max(1, -(-n // segments // unit)) * unit
+    bounds = list(range(0, n, per)) + [n]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def decode_window(data, ix: mp3_frames.FrameIndex, w0: int, w1: int) -> np.ndarray:
+    """PCM [w0, w1) (frame, setelah trim gapless) identik dengan decode_to_pcm(data)[w0:w1],
+    hanya dari frame MP3 yang menutupi rentang itu (+ preroll)."""
+    spf = ix.spf
+    r0, r1 = w0 + ix.skip, w1 + ix.skip
+    fa, fb = r0 // spf, min(ix.frames, -(-r1 // spf))
+    fd = max(0, fa - DECODE_PREROLL)
+    raw = _ffmpeg(["ffmpeg", "-v", "error", "-f", "mp3", "-i", "pipe:0", "-map_metadata", "-1",
+                   "-fflags", "+bitexact", "-acodec", "pcm_s16le", "-f", "s16le", "pipe:1"],
+                  memoryview(data)[ix.offsets[fd]:ix.offsets[fb]])
+    pcm = np.frombuffer(raw, dtype="<i2").reshape(-1, ix.channels)
+    if len(pcm) != (fb - fd) * spf:
+        raise RuntimeError("segment decode returned unexpected length")
+    return pcm[r0 - fd * spf:r1 - fd * spf].copy()
+
+def _encode_window(pcm: np.ndarray, sr: int, ch: int, bitrate: str, path: str, info: bool) -> tuple:
+    """Encode satu jendela ke file (seekable -> ffmpeg mengisi frame Info); return (isi file,
+    [(offset, panjang)] tiap frame). Reservoir mati supaya tiap frame berdiri sendiri saat disambung."""
+    cmd = ["ffmpeg", "-v", "error", "-y", "-f", "s16le", "-ar", str(sr), "-ac", str(ch), "-i", "pipe:0",
+           "-b:a", bitrate, "-reservoir", "0", "-fflags", "+bitexact", "-id3v2_version", "0",
+           "-write_xing", "1" if info else "0", "-f", "mp3", path]
+    _ffmpeg(cmd, memoryview(np.ascontiguousarray(pcm, dtype="<i2")).cast("B"))
+    with open(path, "rb") as f:
+        buf = f.read()
+    return buf, [(off, fh.length) for off, fh in mp3_frames.iter_frames(buf)]
+
+def _segment(data, ix: mp3_frames.FrameIndex, i: int, bounds: list, emb: stego_lsb.BlockEmbedder,
+             acc_args: Optional[tuple], bitrate: str, seg_path: str) -> dict:
+    """Decode -> embed (offset global) -> encode satu segmen; simpan frame milik segmen ke seg_path."""
+    a, b = bounds[i]
+    last = i == len(bounds) - 1
+    spf, ch = ix.spf, ix.channels
+    w0 = max(0, a - ENCODE_PREROLL * spf)
+    w1 = min(ix.samples, b + ENCODE_LOOKAHEAD * spf)
+    pcm = decode_window(data, ix, w0, w1)
+    flat = pcm.reshape(-1)
+    acc = None
+    if acc_args is not None:
+        acc = metrics.QualityAccumulator(*acc_args)
+        own = flat[(a - w0) * ch:(b - w0) * ch]
+        orig = own.copy()
+    written = 0
+    if emb.touches(w0 * ch, flat.size):
+        emb.apply(flat, w0 * ch)  # preroll/lookahead ikut di-embed: encoder melihat input yang sama
+        # yang dihitung hanya inti [a, b): jendela bertumpuk, preroll milik segmen tetangga
+        written = emb.count(a * ch, (b - a) * ch)
+    if acc is not None:
+        acc.add(orig, own, a * ch)
+
+    buf, frames = _encode_window(pcm, ix.sample_rate, ch, bitrate, seg_path + ".enc", info=i == 0)
+    os.remove(seg_path + ".enc")
+    head = frames.pop(0) if i == 0 else None  # frame Info
+    k0 = (a - w0) // spf
+    k1 = len(frames) if last else (b - w0) // spf
+    if len(frames) < k1:
+        raise RuntimeError("segment encode returned too few frames")
+    with open(seg_path, "wb") as f:
+        for off, n in frames[k0:k1]:
+            f.write(buf[off:off + n])
+    return {
+        "frames": k1 - k0,
+        "bytes": os.path.getsize(seg_path),
+        "info": buf[head[0]:head[0] + head[1]] if head else None,
+        "acc": acc,
+        "written": written,
+    }
+
+def _crc16(data: bytes) -> int:
+    """CRC-16/ANSI (poly 0xA001, reflected) seperti CRC tag LAME."""
+    crc = 0
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
+
+def _patch_info(info: bytes, frames: int, audio_bytes: int, spf: int, samples: int) -> bytes:
+    """Sesuaikan frame Info/LAME dari segmen pertama dengan stream gabungan (frame, byte, TOC,
+    padding gapless, panjang musik, CRC tag). CRC musik dikosongkan: butuh pass ulang atas audio."""
+    buf = bytearray(info)
+    fh = mp3_frames._parse_header(buf, 0)
+    off = mp3_frames.xing_offset(fh)
+    flags = int.from_bytes(buf[off + 4:off + 8], "big")
+    total = len(buf) + audio_bytes
+    p = off + 8
+    buf[p:p + 4] = frames.to_bytes(4, "big")
+    p += 4
+    if flags & 2:
+        buf[p:p + 4] = total.to_bytes(4, "big")
+        p += 4
+    if flags & 4:
+        buf[p:p + 100] = bytes(min(255, i * 256 // 100) for i in range(100))  # CBR: linear
+        p += 100
+    if flags & 8:
+        p += 4
+    if bytes(buf[p:p + 4]) in mp3_frames._GAPLESS_ENCODERS and p + 36 <= len(buf):
+        start_pad = mp3_frames._lame_pads(buf, p)[0]
+        end_pad = frames * spf - start_pad - samples
+        if not 0 <= end_pad < 4096:
+            raise RuntimeError("stitched stream padding out of range")
+        buf[p + 21:p + 24] = ((start_pad << 12) | end_pad).to_bytes(3, "big")
+        buf[p + 28:p + 32] = total.to_bytes(4, "big")
+        buf[p + 32:p + 34] = b"\0\0"
+        buf[p + 34:p + 36] = _crc16(buf[:p + 34]).to_bytes(2, "big")
+    return bytes(buf)
+
+@timed("embed_segments")
+def embed_segments(data, out_path: str, payload: bytes, key: str, nlsb: int, random_start: bool,
+                   workers: int, segment_seconds: float = 60, with_quality: bool = True,
+                   bitrate: str = "320k",
+                   progress: Optional[Callable[[float], None]] = None) -> Optional[dict]:
+    """Embed MP3 -> MP3 per segmen secara paralel: tiap segmen di-decode, di-embed dengan offset
+    sampel globalnya, lalu di-encode oleh proses ffmpeg sendiri; frame hasil disambung di batas frame.
+
+    PCM stego identik dengan jalur serial (stream_embed / stego_lsb.embed), jadi payload di LSB dan
+    di ID3 PRIV sama persis; byte MP3 tidak identik karena tiap segmen di-encode terpisah (tanpa bit
+    reservoir). `data` = bytes/mmap cover. None kalau cover bukan MP3 yang bisa dipotong pasti.
+    """
+    ix = mp3_frames.index(data)
+    if ix is None or ix.samples == 0:
+        return None
+    total = ix.samples * ix.channels
+    emb = stego_lsb.BlockEmbedder(payload, key, nlsb, random_start, total)
+    acc_args = (total, ix.channels, emb.start, emb.stop) if with_quality else None
+    segments = max(1, min(workers * 4, int(ix.samples / ix.sample_rate // max(1, segment_seconds)) or 1))
+    bounds = plan(ix, segments)
+    seg_paths = [f"{out_path}.seg{i:04d}" for i in range(len(bounds))]
+    enc_path = out_path + ".enc"
+    try:
+        done = 0
+        results = [None] * len(bounds)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bitify-seg") as ex:
+            futs = {ex.submit(_segment, data, ix, i, bounds, emb, acc_args, bitrate, seg_paths[i]): i
+                    for i in range(len(bounds))}
+            for fut, i in futs.items():
+                results[i] = fut.result()
+                done += 1
+                if progress is not None:
+                    progress(done / len(bounds))
+        if sum(r["written"] for r in results) != emb.total:
+            raise RuntimeError("segments did not cover the whole payload")
+        with stage("stitch"):
+            frames = sum(r["frames"] for r in results)
+            audio = sum(r["bytes"] for r in results)
+            with open(enc_path, "wb") as out:
+                out.write(_patch_info(results[0]["info"], frames, audio, ix.spf, ix.samples))
+                for p in seg_paths:
+                    with open(p, "rb") as f:
+                        shutil.copyfileobj(f, out)
+            id3_tags.write_priv_file(enc_path, out_path, payload)
+    except BaseException:
+        try: os.remove(out_path)
+        except OSError: pass
+        raise
+    finally:
+        for p in [enc_path, *seg_paths]:
+            try: os.remove(p)
+            except OSError: pass
+    acc = None
+    if with_quality:
+        acc = results[0]["acc"]
+        for r in results[1:]:
+            acc.merge(r["acc"])
+    return {
+        "sampleRate": ix.sample_rate,
+        "channels": ix.channels,
+        "frames": ix.samples,
+        "segments": len(bounds),
+        "size": os.path.getsize(out_path),
+        "quality": acc.result() if acc is not None else None,
+    }
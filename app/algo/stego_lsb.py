@@ -1,9 +1,13 @@
 # app/algo/stego_lsb.py
 from typing import Optional
 import numpy as np
-from app.utils.gacha import rng_from_key
+from app.utils.gacha import offset_from_key
 from app.algo.metrics import capacity_bytes
 from typing import Tuple
+from app.utils.telemetry import timed
+
+class CapacityError(ValueError):
+    """Payload tidak muat di cover untuk nlsb yang diminta."""
 
 def _pcm_to_stream(pcm: np.ndarray) -> np.ndarray:
     """Flatten jadi 1D array of samples (int16) interleaved."""
@@ -16,57 +20,166 @@ def _stream_to_pcm(stream: np.ndarray, ch: int) -> np.ndarray:
         return stream.reshape(-1, 1)
     return stream.reshape(-1, ch)
 
+def _payload_values(payload: bytes, nlsb: int) -> np.ndarray:
+    """Pecah payload jadi nilai nlsb-bit per sampel (MSB dulu, chunk terakhir di-pad nol)."""
+    bits = np.unpackbits(np.frombuffer(payload, dtype=np.uint8))
+    n = -(-bits.size // nlsb)
+    if n * nlsb != bits.size:
+        bits = np.concatenate([bits, np.zeros(n * nlsb - bits.size, dtype=np.uint8)])
+    # packbits rata kiri per baris -> satu shift ke kanan jadi nilai nlsb-bit
+    return np.packbits(bits.reshape(n, nlsb), axis=1).reshape(n) >> (8 - nlsb)
+
+def _payload_values_range(payload: bytes, nlsb: int, i: int, j: int) -> np.ndarray:
+    """_payload_values(payload, nlsb)[i:j] tanpa membentuk array untuk seluruh payload."""
+    lo, hi = i * nlsb, j * nlsb
+    chunk = np.frombuffer(payload, dtype=np.uint8, offset=lo // 8, count=min(len(payload), -(-hi // 8)) - lo // 8)
+    bits = np.unpackbits(chunk)[lo % 8:]
+    if bits.size < hi - lo:
+        bits = np.concatenate([bits, np.zeros(hi - lo - bits.size, dtype=np.uint8)])
+    return np.packbits(bits[:hi - lo].reshape(j - i, nlsb), axis=1).reshape(j - i) >> (8 - nlsb)
+
+def key_start(key: str, total_samples: int) -> int:
+    """Offset random_start: hanya dari key + panjang stream, tidak bergantung panjang payload.
+
+    Karena itu extractor bisa langsung membaca header di offset ini (panjang payload ada
+    di header) tanpa mencari; payload yang melewati ujung stream disambung dari sampel 0.
+    """
+    return offset_from_key(key, total_samples)
+
+def span(total_samples: int, payload_len: int, key: str, nlsb: int, random_start: bool) -> Tuple[int, int]:
+    """Rentang sampel stream [start, stop) yang diubah embed untuk payload sepanjang payload_len.
+
+    stop bisa > total_samples (random_start): sisanya melingkar ke [0, stop - total_samples).
+    """
+    n = -(-payload_len * 8 // nlsb)
+    start = key_start(key, total_samples) if random_start else 0
+    return start, start + n
+
+def pieces(start: int, stop: int, total_samples: int) -> list:
+    """Rentang melingkar [start, stop) jadi potongan (a, b, offset nilai payload) di dalam stream."""
+    if stop <= total_samples:
+        return [(start, stop, 0)]
+    return [(start, total_samples, 0), (0, stop - total_samples, total_samples - start)]
+
+def _ring(stream: np.ndarray, start: int, n: int) -> np.ndarray:
+    """stream[start:start+n] dengan wrap ke awal; view kalau tidak melingkar."""
+    if n > stream.size:
+        raise ValueError("not enough samples for requested bits")
+    if start + n <= stream.size:
+        return stream[start:start + n]
+    return np.concatenate([stream[start:], stream[:start + n - stream.size]])
+
+@timed("embed")
 def embed(pcm: np.ndarray, payload: bytes, key: str, nlsb: int, random_start: bool) -> np.ndarray:
-    stream = _pcm_to_stream(pcm).astype(np.int32).copy()
+    stream = _pcm_to_stream(pcm).astype(np.int16, copy=True)
     total_samples = stream.size
     cap = (total_samples * nlsb) // 8
     if len(payload) > cap:
-        raise ValueError("payload exceeds capacity")
+        raise CapacityError("payload exceeds capacity")
 
-    bits = np.unpackbits(np.frombuffer(payload, dtype=np.uint8))
+    values = _payload_values(payload, nlsb)
+    start, stop = span(total_samples, len(payload), key, nlsb, random_start)
 
-    start = 0
-    if random_start:
-        r = rng_from_key(key)
-        start = r.randrange(0, max(1, total_samples - (len(bits)+nlsb-1)//nlsb))
-
-    idx = start
-    mask_keep = ~((1<<nlsb)-1)
-    for i in range(0, len(bits), nlsb):
-        chunk = bits[i:i+nlsb]
-        if chunk.size < nlsb:
-            pad = np.zeros(nlsb - chunk.size, dtype=np.uint8)
-            chunk = np.concatenate([chunk, pad], axis=0)
-        value = 0
-        for b in chunk:
-            value = (value<<1) | int(b)
-        stream[idx] = (stream[idx] & mask_keep) | value
-        idx += 1
-
-    stego = np.clip(stream, -32768, 32767).astype(np.int16)
-    return _stream_to_pcm(stego, pcm.shape[1])
+    for a, b, v in pieces(start, stop, total_samples):
+        seg = stream[a:b]
+        seg &= np.int16(~((1 << nlsb) - 1))
+        seg |= values[v:v + b - a]
+    return _stream_to_pcm(stream, pcm.shape[1])
 
+class BlockEmbedder:
+    """Embed per blok untuk pipeline streaming: tiap blok tahu offset globalnya di stream.
+
+    Hasil gabungan blok identik dengan embed() pada seluruh PCM sekaligus;
+    nilai nlsb-bit dibentuk per blok, jadi memori hanya sebesar payload + satu blok.
+    Objek tidak menyimpan state per blok, jadi aman dipakai bersama oleh beberapa thread;
+    pemanggil menjumlahkan hasil apply()/count() sendiri dan membandingkannya dengan `total`.
+    """
+
+    def __init__(self, payload: bytes, key: str, nlsb: int, random_start: bool, total_samples: int):
+        if len(payload) > (total_samples * nlsb) // 8:
+            raise CapacityError("payload exceeds capacity")
+        self.nlsb = nlsb
+        self.payload = payload
+        self.start, self.stop = span(total_samples, len(payload), key, nlsb, random_start)
+        self.total = self.stop - self.start
+        self._pieces = pieces(self.start, self.stop, total_samples)
+
+    def touches(self, offset: int, size: int) -> bool:
+        return any(a < offset + size and offset < b for a, b, _ in self._pieces)
+
+    def count(self, offset: int, size: int) -> int:
+        """Jumlah sampel rentang embed di dalam [offset, offset + size)."""
+        return sum(max(0, min(hi, offset + size) - max(lo, offset)) for lo, hi, _ in self._pieces)
+
+    def apply(self, block: np.ndarray, offset: int) -> int:
+        """Ubah in place bagian `block` (stream int16 1D, sampel global offset..) yang masuk rentang.
+        Return jumlah sampel yang diubah."""
+        written = 0
+        for lo, hi, v in self._pieces:
+            a = max(lo, offset)
+            b = min(hi, offset + block.size)
+            if a >= b:
+                continue
+            seg = block[a - offset:b - offset]
+            seg &= np.int16(~((1 << self.nlsb) - 1))
+            seg |= _payload_values_range(self.payload, self.nlsb, a - lo + v, b - lo + v)
+            written += b - a
+        return written
+
+# sampel per langkah embed_inplace: salinan asli untuk PSNR sebatas ~1 MB
+INPLACE_BLOCK = 1 << 19
+
+@timed("embed")
+def embed_inplace(pcm: np.ndarray, payload: bytes, key: str, nlsb: int, random_start: bool,
+                  acc=None, block: int = INPLACE_BLOCK) -> Tuple[int, int]:
+    """embed() tanpa salinan cover: `pcm` (writable, mis. memmap workspace) diubah in place.
+
+    Hanya rentang span() yang dibaca/ditulis, per blok. `acc` (metrics.QualityAccumulator,
+    opsional) menerima salinan asli + hasil tiap blok. Return (start, stop) seperti span().
+    """
+    stream = _pcm_to_stream(pcm)
+    emb = BlockEmbedder(payload, key, nlsb, random_start, stream.size)
+    align = acc.seg if acc is not None else 1
+    block = max(align, block // align * align)
+    # rentang dibulatkan ke segmen acc; potongan yang melingkar bisa bersinggungan -> digabung
+    ranges = []
+    for lo, hi, _ in sorted(emb._pieces):
+        a, b = lo // align * align, min(stream.size, -(-hi // align) * align)
+        if ranges and a <= ranges[-1][1]:
+            ranges[-1][1] = max(ranges[-1][1], b)
+        elif a < b:
+            ranges.append([a, b])
+    for a, b in ranges:
+        for i in range(a, b, block):
+            blk = stream[i:min(i + block, b)]
+            orig = blk.copy() if acc is not None else None
+            emb.apply(blk, i)
+            if acc is not None:
+                acc.add(orig, blk, i)
+    return emb.start, emb.stop
+
+@timed("extract")
 def extract(
     pcm: np.ndarray,
     nlsb: int,
     key: str,
     random_start: bool,
     total_bits: int,
-    start_hint: Optional[int] = None,   # <- ini
+    start_hint: Optional[int] = None,
 ) -> bytes:
-    stream = _pcm_to_stream(pcm).astype(np.int32)
-    total_samples = stream.size
+    """Baca total_bits dari LSB mulai start_hint, atau offset key_start() untuk random_start."""
+    stream = _pcm_to_stream(pcm)
 
-    if random_start and start_hint is None:
-        raise ValueError("start_hint required for random_start in generic extract")
-
-    idx = start_hint or 0
-    chunks = []
-    for _ in range(0, total_bits, nlsb):
-        value = stream[idx] & ((1<<nlsb)-1)
-        chunk = [(value >> (nlsb-1-i)) & 1 for i in range(nlsb)]
-        chunks.extend(chunk)
-        idx += 1
-    bits = np.array(chunks[:total_bits], dtype=np.uint8)
-    bys = np.packbits(bits).tobytes()
-    return bys
+    if start_hint is not None:
+        idx = start_hint
+    else:
+        idx = key_start(key, stream.size) if random_start else 0
+    n = -(-total_bits // nlsb)
+    seg = _ring(stream, idx, n)
+    # cast ke uint8 = byte rendah sampel; hanya salinan seukuran payload
+    values = seg.astype(np.uint8)
+    values &= (1 << nlsb) - 1
+    if nlsb == 8 and total_bits % 8 == 0:
+        return values.tobytes()
+    bits = np.unpackbits(values.reshape(-1, 1), axis=1)[:, 8 - nlsb:].reshape(-1)
+    return np.packbits(bits[:total_bits]).tobytes()
@@ -0,0 +1,89 @@
+# app/algo/stream_embed.py
+import os
+from typing import Callable, Optional
+from app.algo import mp3_io, stego_lsb, metrics, id3_tags
+from app.utils.telemetry import timed
+
+# 64k frame stereo = 256 KB per blok; kelipatan SEG_FRAMES supaya segmental SNR tidak terpotong
+BLOCK_FRAMES = 64 * metrics.SEG_FRAMES
+
+def _count(path: str, block_frames: int) -> int:
+    """Pass hitung untuk stream yang panjangnya tidak bisa dibaca dari header."""
+    n = 0
+    with mp3_io.PcmReader(path) as rd:
+        while True:
+            blk = rd.read(block_frames)
+            if not len(blk):
+                return n
+            n += len(blk)
+
+def _pass(cover_path: str, enc_path: str, frames: int, payload: bytes, key: str, nlsb: int,
+          random_start: bool, fmt: str, with_quality: bool, block_frames: int,
+          progress: Optional[Callable[[float], None]]):
+    with mp3_io.PcmReader(cover_path) as rd:
+        total = frames * rd.ch
+        emb = stego_lsb.BlockEmbedder(payload, key, nlsb, random_start, total)
+        acc = metrics.QualityAccumulator(total, rd.ch, emb.start, emb.stop) if with_quality else None
+        offset = written = 0
+        with mp3_io.PcmWriter(enc_path, rd.sr, rd.ch, fmt) as wr:
+            while True:
+                blk = rd.read(block_frames)
+                if not len(blk):
+                    break
+                flat = blk.reshape(-1)
+                if emb.touches(offset, flat.size):
+                    orig = flat.copy() if acc is not None else None
+                    written += emb.apply(flat, offset)
+                    if acc is not None:
+                        acc.add(orig, flat, offset)
+                wr.write(blk)
+                offset += flat.size
+                if progress is not None and total:
+                    progress(offset / total)
+        return offset // rd.ch, rd.sr, rd.ch, written >= emb.total, acc
+
+@timed("embed_stream")
+def embed_stream(cover_path: str, out_path: str, payload: bytes, key: str, nlsb: int,
+                 random_start: bool, fmt: str = "mp3", with_quality: bool = True,
+                 block_frames: int = BLOCK_FRAMES,
+                 progress: Optional[Callable[[float], None]] = None) -> dict:
+    """Embed dari file cover ke file output blok demi blok: decode pipe -> LSB -> encode pipe.
+
+    Memori puncak sebatas satu blok PCM + payload, tidak bergantung panjang lagu.
+    `progress` (opsional) dipanggil tiap blok dengan fraksi stream yang sudah diproses.
+    Hasil PCM identik dengan stego_lsb.embed() pada cover yang di-decode utuh.
+    MP3 tetap membawa payload di ID3 PRIV, dipasang setelah encode selesai.
+    """
+    block_frames = max(1, block_frames // metrics.SEG_FRAMES) * metrics.SEG_FRAMES
+    frames = mp3_io.count_frames(cover_path)
+    if frames is None:
+        frames = _count(cover_path, block_frames)
+    enc_path = out_path + ".enc" if fmt == "mp3" else out_path
+    try:
+        got, sr, ch, done, acc = _pass(cover_path, enc_path, frames, payload, key, nlsb,
+                                       random_start, fmt, with_quality, block_frames, progress)
+        if got != frames:
+            # header salah hitung (jarang): ulang dengan panjang sebenarnya supaya posisi sama dengan embed()
+            frames = got
+            got, sr, ch, done, acc = _pass(cover_path, enc_path, frames, payload, key, nlsb,
+                                           random_start, fmt, with_quality, block_frames, progress)
+        if not done:
+            raise stego_lsb.CapacityError("cover stream ended before payload was embedded")
+        if fmt == "mp3":
+            id3_tags.write_priv_file(enc_path, out_path, payload)
+    except BaseException:
+        for p in {enc_path, out_path}:
+            try: os.remove(p)
+            except OSError: pass
+        raise
+    finally:
+        if enc_path != out_path:
+            try: os.remove(enc_path)
+            except OSError: pass
+    return {
+        "sampleRate": sr,
+        "channels": ch,
+        "frames": frames,
+        "size": os.path.getsize(out_path),
+        "quality": acc.result() if acc is not None else None,
+    }
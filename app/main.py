@@ -1,18 +1,38 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers.stego import router as stego_router
-import os
+from contextlib import asynccontextmanager
+from app.routers.stego import router as stego_router, STEGO_STORE, STORE_SWEEP_SEC, PCM_CACHE, JOBS, ADMIT_UPLOAD
+from app.utils.admission import UploadAdmission
+from app.utils import pool
+from app.utils.telemetry import TimingMiddleware
+import asyncio, os
 
-app = FastAPI(title="Bitify API", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    sweeper = asyncio.create_task(STEGO_STORE.run_expiry(STORE_SWEEP_SEC))
+    JOBS.start()
+    yield
+    await JOBS.stop()
+    sweeper.cancel()
+    STEGO_STORE.close()
+    PCM_CACHE.clear()
+    pool.shutdown()
+
+app = FastAPI(title="Bitify API", version="0.1.0", lifespan=lifespan)
 
 ALLOWED = os.getenv("ALLOWED_ORIGINS", "http://localhost:5173,http://localhost:3000").split(",")
+# upload dihitung ke budget byte sebelum body dibaca; penuh -> 429
+app.add_middleware(UploadAdmission, gate=ADMIT_UPLOAD)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=ALLOWED,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Profile"],
 )
+# paling luar: Server-Timing & durasi request juga mencakup 429 dari admission
+app.add_middleware(TimingMiddleware, profile_dir=os.getenv("PROFILE_DIR") or None)
 
 @app.get("/api/health")
 def health():
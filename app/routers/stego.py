@@ -1,60 +1,578 @@
 # app/routers/stego.py
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request
-from fastapi.responses import StreamingResponse
+from fastapi.responses import FileResponse, PlainTextResponse, Response
 from app.algo import mp3_io, stego_lsb, crypto, pack, metrics
-from app.algo import id3_tags
+from app.algo import id3_tags, header_probe, mp3_frames, stream_embed, segment_embed, compress
 from app.utils.gacha import seed_from_key
-import io, numpy as np
-import time, uuid
+from app.utils.pool import run_cpu, run_io
+from app.utils.store import ResultStore, FileStore
+from app.utils.pcm_cache import PcmCache, content_key
+from app.utils import jobs, telemetry
+from app.utils.admission import Gate, Overloaded, detach_upload
+import numpy as np
 import mimetypes
-import os
+import asyncio, os, shutil, subprocess, tempfile
+from contextlib import asynccontextmanager, nullcontext
+from typing import Optional
 
 router = APIRouter()
 STRICT_AUDIO_ONLY = os.getenv("STRICT_AUDIO_ONLY", "1") == "1"
 
-STEGO_STORE: dict[str, dict] = {}
-STEGO_TTL_SEC = 300
+STEGO_TTL_SEC = int(os.getenv("STORE_TTL_SEC", "300"))
+# memory: per proses (cukup untuk 1 worker); fs: direktori bersama untuk uvicorn --workers N
+STORE_BACKEND = os.getenv("STORE_BACKEND", "memory")
+if STORE_BACKEND == "fs":
+    STEGO_STORE = FileStore(
+        root=os.getenv("STORE_DIR") or os.path.join(tempfile.gettempdir(), "bitify-shared"),
+        ttl_sec=STEGO_TTL_SEC,
+        max_bytes=int(os.getenv("STORE_SPILL_MAX_BYTES", str(4 << 30))),
+    )
+else:
+    STEGO_STORE = ResultStore(
+        ttl_sec=STEGO_TTL_SEC,
+        max_bytes=int(os.getenv("STORE_MAX_BYTES", str(512 << 20))),
+        spill_dir=os.getenv("STORE_SPILL_DIR") or None,
+        spill_threshold=int(os.getenv("STORE_SPILL_THRESHOLD", str(8 << 20))),
+        spill_max_bytes=int(os.getenv("STORE_SPILL_MAX_BYTES", str(4 << 30))),
+    )
+STORE_SWEEP_SEC = float(os.getenv("STORE_SWEEP_SEC", "30"))
+
+PCM_CACHE = PcmCache(
+    max_bytes=int(os.getenv("PCM_CACHE_MAX_BYTES", str(256 << 20))),
+    mmap_dir=os.getenv("PCM_CACHE_DIR") or None,
+)
+
+# cover sebesar ini atau lebih di-embed lewat pipeline streaming (memori sebatas satu blok PCM)
+STREAM_THRESHOLD_BYTES = int(os.getenv("STREAM_THRESHOLD_BYTES", str(64 << 20)))
+# kalau di-set, embed non-streaming memakai PCM di memmap direktori ini (bukan heap proses)
+PCM_WORKSPACE_DIR = os.getenv("PCM_WORKSPACE_DIR") or None
+if STORE_BACKEND == "fs" and PCM_WORKSPACE_DIR and \
+        os.path.realpath(PCM_WORKSPACE_DIR) == os.path.realpath(STEGO_STORE.root):
+    # sweeper store fs membuang file asing di root-nya; workspace dipindah ke subdirektori kerja
+    PCM_WORKSPACE_DIR = STEGO_STORE.spill_dir
+# MP3 -> MP3 sebesar ini atau lebih: decode/embed/encode per segmen oleh PARALLEL_WORKERS ffmpeg (0 = mati)
+PARALLEL_WORKERS = int(os.getenv("PARALLEL_WORKERS", "0"))
+PARALLEL_SEGMENT_SECONDS = float(os.getenv("PARALLEL_SEGMENT_SECONDS", "60"))
+PARALLEL_THRESHOLD_BYTES = int(os.getenv("PARALLEL_THRESHOLD_BYTES", str(16 << 20)))
+
+# admission control: batas proses ffmpeg bersamaan & total byte upload in-flight.
+# Batas berlaku per proses; default core dibagi rata ke WEB_CONCURRENCY worker uvicorn.
+_CORES_PER_WORKER = str(max(1, (os.cpu_count() or 2) // int(os.getenv("WEB_CONCURRENCY", "1"))))
+_ADMIT_WAITERS = int(os.getenv("ADMIT_MAX_WAITERS", "16"))
+_ADMIT_WAIT_SEC = float(os.getenv("ADMIT_MAX_WAIT_SEC", "10"))
+_ADMIT_RETRY_AFTER = int(os.getenv("ADMIT_RETRY_AFTER_SEC", "2"))
+ADMIT_DECODE = Gate("decode", int(os.getenv("ADMIT_MAX_DECODES", _CORES_PER_WORKER)),
+                    _ADMIT_WAITERS, _ADMIT_WAIT_SEC, _ADMIT_RETRY_AFTER)
+ADMIT_ENCODE = Gate("encode", int(os.getenv("ADMIT_MAX_ENCODES", _CORES_PER_WORKER)),
+                    _ADMIT_WAITERS, _ADMIT_WAIT_SEC, _ADMIT_RETRY_AFTER)
+ADMIT_UPLOAD = Gate("upload", int(os.getenv("ADMIT_MAX_UPLOAD_BYTES", str(1 << 30))),
+                    _ADMIT_WAITERS, _ADMIT_WAIT_SEC, _ADMIT_RETRY_AFTER)
+
+# job async: worker = jumlah job berat yang jalan bersamaan, sisanya antri
+JOBS = jobs.JobQueue(
+    workers=int(os.getenv("JOB_WORKERS", "2")),
+    max_queued=int(os.getenv("JOB_QUEUE_MAX", "64")),
+    ttl_sec=STEGO_TTL_SEC,
+    # status job juga ditulis ke store supaya bisa di-poll dari worker mana pun
+    on_change=lambda view: run_io(STEGO_STORE.put_record, "job", view["jobId"], view),
+)
+JOB_RETRY_AFTER_SEC = 5
+# prioritas job dari klien dibatasi supaya tidak ada yang bisa selalu menyalip antrian
+JOB_PRIORITY_MAX = 10
+
+telemetry.gauge("bitify_store", "Isi result store (entri, byte RAM/disk, hit/miss).", STEGO_STORE.stats)
+telemetry.gauge("bitify_pcm_cache", "Isi cache PCM hasil decode.",
+                lambda: {k: int(v) for k, v in PCM_CACHE.stats().items()})
+telemetry.gauge("bitify_jobs", "Jumlah job async per status.", JOBS.stats)
+for _gate in (ADMIT_DECODE, ADMIT_ENCODE, ADMIT_UPLOAD):
+    telemetry.gauge(f"bitify_admission_{_gate.name}", f"Gate admission {_gate.name}: slot, antrian, waktu tunggu.",
+                    _gate.stats)
+
+def _decode(audio_bytes: bytes, key: Optional[str] = None):
+    """decode_to_pcm lewat cache; check-capacity -> embed, atau extract berulang, cukup sekali decode."""
+    return PCM_CACHE.get_or_decode(audio_bytes, mp3_io.decode_to_pcm, key)
+
+@asynccontextmanager
+async def _admit(gate: Gate, weight: int = 1):
+    """Slot gate; worker job menunggu tanpa batas, request HTTP hanya sebentar lalu 429."""
+    try:
+        await gate.acquire(weight, max_wait=None if jobs.current() is not None else -1)
+    except Overloaded as e:
+        raise HTTPException(429, f"Server busy ({e.gate}), retry later.", headers={"Retry-After": str(e.retry_after)})
+    try:
+        yield
+    finally:
+        gate.release(weight)
+
+async def _gated(gate: Gate, fn, *args, **kwargs):
+    async with _admit(gate):
+        return await run_io(fn, *args, **kwargs)
+
+def _admit_decode(wav: bool):
+    """Slot decode hanya kalau ffmpeg benar-benar di-spawn; WAV PCM 16-bit dibaca langsung."""
+    return nullcontext() if wav else _admit(ADMIT_DECODE)
+
+async def _decode_admitted(audio_bytes: bytes):
+    """_decode; hit cache PCM dan WAV PCM 16-bit tidak memakai slot decode, jadi tidak kena 429."""
+    key = await run_io(content_key, audio_bytes)
+    hit = PCM_CACHE.get(key)
+    if hit is not None:
+        return hit
+    async with _admit_decode(mp3_io.parse_wav(audio_bytes) is not None):
+        return await run_io(_decode, audio_bytes, key)
 
-def _put_stego(data: bytes, mime: str = "audio/mpeg", filename: str = "stego.mp3") -> str:
-    token = uuid.uuid4().hex
-    STEGO_STORE[token] = {"data": data, "mime": mime, "ts": time.time(), "filename": filename}
-    now = time.time()
-    dead = [k for k, v in STEGO_STORE.items() if now - v["ts"] > STEGO_TTL_SEC]
-    for k in dead:
-        STEGO_STORE.pop(k, None)
-    return token
+def _put_stego(data: bytes, mime: str = "audio/mpeg", filename: str = "stego.mp3", meta: Optional[dict] = None) -> str:
+    return STEGO_STORE.put(data, mime=mime, filename=filename, meta=meta)
+
+OUT_FORMATS = {
+    "mp3": ("audio/mpeg", "stego.mp3"),
+    "wav": ("audio/wav", "stego.wav"),
+    "flac": ("audio/flac", "stego.flac"),
+}
+
+def _render(fmt: str, stego_pcm: np.ndarray, sr: int, ch: int, full_payload: bytes) -> bytes:
+    """Encode stego PCM ke satu format output. MP3 membawa payload di ID3 PRIV (LSB tidak tahan lossy)."""
+    if fmt == "wav":
+        return mp3_io.encode_wav_from_pcm(stego_pcm, sr, ch)
+    if fmt == "flac":
+        return mp3_io.encode_flac_from_pcm(stego_pcm, sr, ch)
+    mp3_out = mp3_io.encode_from_pcm(stego_pcm, sr, ch, bitrate="320k")
+    return id3_tags.write_priv(mp3_out, full_payload)
+
+def _stego_pcm(data: bytes, lsb: dict, need_payload: bool):
+    """PCM stego dari blob lossless (WAV/FLAC) yang tersimpan; payload PRIV dibaca ulang dari LSB-nya."""
+    pcm, sr, ch, _ = mp3_io.decode_to_pcm(data)
+    payload = None
+    if need_payload:
+        payload = stego_lsb.extract(pcm, lsb["nlsb"], "", False, lsb["bits"], start_hint=lsb["start"])
+    return pcm, sr, ch, payload
+
+# (token, fmt) -> [lock, pemakai]; entri hidup selama masih ada yang memegang/menunggu lock,
+# supaya pendatang baru tidak membuat lock kedua dan merender varian yang sama bersamaan
+_VARIANT_LOCKS: dict[tuple[str, str], list] = {}
+
+async def _variant(token: str, item, fmt: str):
+    """Format lain dari hasil embed: render dari output lossless (atau sumber WAV opsional) saat
+    pertama diminta, lalu di-cache."""
+    if item.meta.get("variants") is None or fmt not in OUT_FORMATS:
+        raise HTTPException(404, f"Format {fmt!r} not available for this token")
+    slot = _VARIANT_LOCKS.setdefault((token, fmt), [asyncio.Lock(), 0])
+    slot[1] += 1
+    try:
+        async with slot[0]:
+            # baca ulang: varian bisa sudah dibuat request lain / worker lain
+            item = STEGO_STORE.get(token)
+            if item is None:
+                raise HTTPException(404, "Not found")
+            meta = item.meta
+            vt = meta["variants"].get(fmt)
+            v = STEGO_STORE.get(vt) if vt else None
+            if v is not None:
+                return vt, v
+            src = STEGO_STORE.get(meta["source"]) if "source" in meta else item
+            if src is None:
+                raise HTTPException(410, "Stego source expired")
+            data = await run_io(src.read)
+            async with _admit_decode(mp3_io.parse_wav(data) is not None):
+                pcm, sr, ch, payload = await run_io(_stego_pcm, data, meta["lsb"], fmt == "mp3")
+            data = await _gated(ADMIT_ENCODE, _render, fmt, pcm, sr, ch, payload)
+            mime, name = OUT_FORMATS[fmt]
+            vt = await run_io(_put_stego, data, mime=mime, filename=name, meta={"fmt": fmt})
+            meta["variants"][fmt] = vt
+            await run_io(STEGO_STORE.update_meta, token, meta)
+            return vt, STEGO_STORE.get(vt)
+    finally:
+        slot[1] -= 1
+        if not slot[1]:
+            del _VARIANT_LOCKS[(token, fmt)]
+
+def _etag_match(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+def _parse_range(header: str, size: int) -> Optional[tuple[int, int]]:
+    """Satu range "bytes=a-b" / "a-" / "-n" -> (start, end) inklusif.
+    None kalau header diabaikan (multi-range, format lain); 416 kalau di luar ukuran."""
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first == "":
+            n = int(last)
+            start, end = max(0, size - n), size - 1
+            if n == 0:
+                start = size
+        else:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise HTTPException(416, "Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+class _BlobFileResponse(FileResponse):
+    """FileResponse atas blob disk yang sudah dibuka handler (Starlette tetap yang mengirim file).
+
+    Lewat /proc/self/fd isi file tetap terbaca walau sweeper meng-unlink-nya sebelum terkirim.
+    Range sudah diputuskan download(): kalau diabaikan (multi-range / tidak valid), header Range
+    dibuang dari scope supaya hasilnya 200 penuh, sama seperti blob di RAM.
+    """
+
+    def __init__(self, fd: int, path: str, use_range: bool, **kwargs):
+        self._fd = fd
+        self._use_range = use_range
+        super().__init__(path, stat_result=os.fstat(fd), **kwargs)
+
+    async def __call__(self, scope, receive, send):
+        if not self._use_range:
+            scope = {**scope, "headers": [(k, v) for k, v in scope["headers"] if k != b"range"]}
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            os.close(self._fd)
 
 @router.get("/download/{token}")
-def download(token: str):
+async def download(token: str, request: Request, format: Optional[str] = None):
     item = STEGO_STORE.get(token)
     if not item:
         raise HTTPException(404, "Not found")
+    if format and format.lower() != item.meta.get("fmt"):
+        token, item = await _variant(token, item, format.lower())
+        if not item:
+            raise HTTPException(404, "Not found")
+    # isi per token tidak pernah berubah, jadi token + ukuran cukup jadi ETag kuat
+    etag = f'"{token}-{item.size}"'
     headers = {
-        "Content-Disposition": f'attachment; filename="{item["filename"]}"',
-        "Content-Length": str(len(item["data"])),
+        "Content-Disposition": f'attachment; filename="{item.filename}"',
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={STEGO_TTL_SEC}",
     }
-    return StreamingResponse(io.BytesIO(item["data"]), media_type=item["mime"], headers=headers)
+    if _etag_match(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={k: headers[k] for k in ("ETag", "Cache-Control")})
+
+    # Range diputuskan di sini untuk blob RAM maupun disk: multi-range / tidak valid -> 200 penuh
+    span = None
+    rng = request.headers.get("range")
+    if rng and request.headers.get("if-range", etag) == etag:
+        span = _parse_range(rng, item.size)
+
+    if item.path is not None:
+        try:
+            fd = os.open(item.path, os.O_RDONLY)
+        except FileNotFoundError:
+            raise HTTPException(404, "Not found")
+        path = f"/proc/self/fd/{fd}" if os.path.isdir("/proc/self/fd") else item.path
+        return _BlobFileResponse(fd, path, span is not None, media_type=item.mime, headers=headers)
+
+    start, end, status = 0, item.size - 1, 200
+    if span is not None:
+        (start, end), status = span, 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{item.size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return Response(memoryview(item.data)[start:end + 1], status_code=status,
+                    media_type=item.mime, headers=headers)
+
+@router.get("/store/stats")
+def store_stats():
+    return STEGO_STORE.stats()
+
+@router.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(telemetry.render(), media_type="text/plain; version=0.0.4")
+
+@router.get("/admission/stats")
+def admission_stats():
+    return {g.name: g.stats() for g in (ADMIT_DECODE, ADMIT_ENCODE, ADMIT_UPLOAD)}
+
+@router.get("/pcm-cache/stats")
+def pcm_cache_stats():
+    return PCM_CACHE.stats()
+
+def _stream_shape(audio_bytes: bytes) -> Optional[tuple[int, int]]:
+    """(frames, channels) dari header WAV / frame MP3; None kalau stream ambigu (perlu decode penuh)."""
+    wav = mp3_io.parse_wav(audio_bytes)
+    if wav is not None:
+        return len(wav[0]), wav[2]
+    info = mp3_frames.scan(audio_bytes)
+    if info is not None:
+        return info.samples, info.channels
+    return None
 
 @router.post("/check-capacity")
 async def check_capacity(
     coverAudio: UploadFile = File(...),
-    lsbBits: int = Form(...),
+    lsbBits: Optional[int] = Form(None),
 ):
-    """Hitung kapasitas maksimal (bytes) untuk lsbBits (1..8)."""
-    if not (1 <= lsbBits <= 8):
+    """Hitung kapasitas maksimal (bytes) untuk lsbBits (1..8); `capacities` berisi semua nilai 1..8."""
+    if lsbBits is not None and not (1 <= lsbBits <= 8):
         raise HTTPException(422, "lsbBits must be 1..8")
 
     mp3_bytes = await coverAudio.read()
     try:
-        pcm, sr, ch, meta = mp3_io.decode_to_pcm(mp3_bytes)
+        shape = await run_io(_stream_shape, mp3_bytes)
+        if shape is None:
+            pcm, sr, ch, meta = await _decode_admitted(mp3_bytes)
+            shape = len(pcm), ch
+        frames, ch = shape
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(400, f"Failed to decode MP3: {e}")
-    frames = len(pcm)
-    max_bytes = metrics.capacity_bytes(frames, ch, lsbBits)
+
+    capacities = []
+    for n in range(1, 9):
+        b = metrics.capacity_bytes(frames, ch, n)
+        capacities.append({"lsbBits": n, "maxCapacityBytes": int(b), "maxCapacityMB": round(b / (1024 * 1024), 2)})
+
+    resp = {"capacities": capacities}
+    if lsbBits is not None:
+        resp.update({k: v for k, v in capacities[lsbBits - 1].items() if k != "lsbBits"})
+    return resp
+
+def _spool(upload: UploadFile) -> str:
+    """Salin upload ke file di spill dir (filesystem sama dengan store -> hasil bisa di-rename)."""
+    os.makedirs(STEGO_STORE.spill_dir, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=STEGO_STORE.spill_dir, suffix=".cover")
+    with os.fdopen(fd, "wb") as f:
+        upload.file.seek(0)
+        shutil.copyfileobj(upload.file, f, 1 << 20)
+    return path
+
+def _remove(path: str) -> None:
+    try: os.remove(path)
+    except FileNotFoundError: pass
+
+def _workspace_embed(cover_bytes: bytes, full_payload: bytes, key: str, nlsb: int,
+                     random_start: bool, fmt: str, with_psnr: bool, keep_source: bool):
+    """Decode ke memmap, embed in place, encode langsung ke file.
+    Return (path output, path WAV sumber atau None, offset awal payload, report)."""
+    os.makedirs(PCM_WORKSPACE_DIR, exist_ok=True)
+    with mp3_io.decode_to_workspace(cover_bytes, PCM_WORKSPACE_DIR) as ws:
+        jobs.report(0.2)
+        cap = metrics.capacity_bytes(len(ws.pcm), ws.ch, nlsb)
+        if len(full_payload) > cap:
+            raise HTTPException(413, f"Payload exceeds capacity ({len(full_payload)} > {cap})")
+        acc = None
+        if with_psnr:
+            start, stop = stego_lsb.span(ws.pcm.size, len(full_payload), key, nlsb, random_start)
+            acc = metrics.QualityAccumulator(ws.pcm.size, ws.ch, start, stop)
+        start, _ = stego_lsb.embed_inplace(ws.pcm, full_payload, key, nlsb, random_start, acc)
+        jobs.report(0.4)
+        out_path = ws.path + "." + fmt
+        src_path = ws.path + ".wav" if fmt == "mp3" and keep_source else None
+        try:
+            if fmt == "mp3":
+                ws.encode_to(out_path + ".enc", fmt)
+                try:
+                    id3_tags.write_priv_file(out_path + ".enc", out_path, full_payload)
+                finally:
+                    _remove(out_path + ".enc")
+            else:
+                ws.encode_to(out_path, fmt)
+            if src_path:
+                ws.encode_to(src_path, "wav")
+        except BaseException:
+            for p in (out_path, src_path):
+                if p: _remove(p)
+            raise
+    return out_path, src_path, start, acc.result() if acc is not None else None
+
+def _variant_meta(fmt: str, nlsb: int, start: int, payload_len: int, source: Optional[str]) -> dict:
+    """Meta token hasil: varian bisa dibuat dari output lossless, atau dari sumber WAV (MP3, opsional).
+    Posisi payload di LSB disimpan supaya payload PRIV untuk varian MP3 bisa dibaca ulang."""
+    if fmt == "mp3" and source is None:
+        return {"fmt": fmt}
+    meta = {"fmt": fmt, "variants": {}, "lsb": {"nlsb": nlsb, "start": start, "bits": payload_len * 8}}
+    if source is not None:
+        meta["source"] = meta["variants"]["wav"] = source
+    return meta
+
+async def _embed_workspace(cover_bytes: bytes, full_payload: bytes, key: str, nlsb: int,
+                           random_start: bool, fmt: str, with_psnr: bool, keep_source: bool):
+    """Seperti _embed_buffered, tapi cover tidak pernah utuh di RAM: PCM di memmap, hasil diadopsi store."""
+    async with _admit_decode(mp3_io.parse_wav(cover_bytes) is not None), _admit(ADMIT_ENCODE):
+        out_path, src_path, start, report = await run_io(_workspace_embed, cover_bytes, full_payload, key, nlsb,
+                                                         random_start, fmt, with_psnr, keep_source)
+    jobs.report(0.8)
+    source = None
+    if src_path:
+        source = await run_io(STEGO_STORE.put_file, src_path, mime=OUT_FORMATS["wav"][0],
+                              filename=OUT_FORMATS["wav"][1], meta={"fmt": "wav"})
+    meta = _variant_meta(fmt, nlsb, start, len(full_payload), source)
+    out_mime, out_name = OUT_FORMATS[fmt]
+    out_size = os.path.getsize(out_path)
+    token = await run_io(STEGO_STORE.put_file, out_path, mime=out_mime, filename=out_name, meta=meta)
+    return token, out_size, report, list(OUT_FORMATS) if "variants" in meta else [fmt]
+
+async def _embed_buffered(cover_bytes: bytes, full_payload: bytes, key: str, nlsb: int,
+                          random_start: bool, fmt: str, with_psnr: bool, keep_source: bool = False):
+    if PCM_WORKSPACE_DIR:
+        return await _embed_workspace(cover_bytes, full_payload, key, nlsb, random_start, fmt, with_psnr,
+                                      keep_source)
+    pcm, sr, ch, meta = await _decode_admitted(cover_bytes)
+    jobs.report(0.2)
+    cap = metrics.capacity_bytes(len(pcm), ch, nlsb)
+    if len(full_payload) > cap:
+        raise HTTPException(413, f"Payload exceeds capacity ({len(full_payload)} > {cap})")
+
+    stego_pcm = await run_cpu(stego_lsb.embed, pcm, full_payload, key, nlsb, random_start)
+    jobs.report(0.4)
+    # hanya format yang diminta yang di-encode; format lain dibuat saat pertama diunduh
+    out_bytes = await _gated(ADMIT_ENCODE, _render, fmt, stego_pcm, sr, ch, full_payload)
+    out_mime, out_name = OUT_FORMATS[fmt]
+    source = None
+    if fmt == "mp3" and keep_source:
+        # MP3 lossy: varian lain hanya bisa dibuat dari sumber WAV yang diminta klien
+        wav = await run_cpu(mp3_io.encode_wav_from_pcm, stego_pcm, sr, ch)
+        source = await run_io(_put_stego, wav, mime=OUT_FORMATS["wav"][0], filename=OUT_FORMATS["wav"][1],
+                              meta={"fmt": "wav"})
+    jobs.report(0.8)
+
+    start, stop = stego_lsb.span(pcm.size, len(full_payload), key, nlsb, random_start)
+    report = None
+    if with_psnr:
+        # hanya rentang sampel yang disentuh embed yang dibandingkan
+        report = await run_cpu(metrics.quality, pcm, stego_pcm, start, stop)
+
+    meta = _variant_meta(fmt, nlsb, start, len(full_payload), source)
+    token = await run_io(_put_stego, out_bytes, mime=out_mime, filename=out_name, meta=meta)
+    return token, len(out_bytes), report, list(OUT_FORMATS) if "variants" in meta else [fmt]
+
+def _parallel(fmt: str, cover_size: int) -> bool:
+    return PARALLEL_WORKERS > 0 and fmt == "mp3" and cover_size >= PARALLEL_THRESHOLD_BYTES
+
+def _embed_segments(cover_path: str, out_path: str, full_payload: bytes, key: str, nlsb: int,
+                    random_start: bool, with_psnr: bool) -> Optional[dict]:
+    """segment_embed di atas mmap cover yang di-spool; None kalau cover bukan MP3 yang bisa dipotong."""
+    mm = mp3_io._map_file(cover_path)
+    if mm is None:
+        return None
+    try:
+        return segment_embed.embed_segments(mm, out_path, full_payload, key, nlsb, random_start,
+                                            PARALLEL_WORKERS, PARALLEL_SEGMENT_SECONDS, with_psnr,
+                                            progress=jobs.report)
+    except (RuntimeError, subprocess.CalledProcessError):
+        # segmen tidak bisa dipetakan pasti / ffmpeg gagal pada potongan stream -> jalur serial
+        return None
+    finally:
+        try: mm.close()
+        except BufferError: pass  # masih ada view; dilepas GC
+
+async def _embed_streaming(cover_path: str, full_payload: bytes, key: str, nlsb: int,
+                           random_start: bool, fmt: str, with_psnr: bool, keep_source: bool = False):
+    """Cover yang sudah di-spool diproses blok demi blok; hasil diadopsi store tanpa masuk RAM."""
+    out_path = cover_path[:-len(".cover")] + "." + fmt
+    try:
+        info = None
+        wav = await run_io(mp3_io.is_pcm_wav, cover_path)
+        if not wav and _parallel(fmt, os.path.getsize(cover_path)):
+            # tiap segmen memakai satu proses decode + satu encode
+            async with _admit(ADMIT_DECODE, PARALLEL_WORKERS), _admit(ADMIT_ENCODE, PARALLEL_WORKERS):
+                info = await run_io(_embed_segments, cover_path, out_path, full_payload,
+                                    key, nlsb, random_start, with_psnr)
+        if info is None:
+            # satu proses decode + satu encode hidup sepanjang pipeline
+            async with _admit_decode(wav), _admit(ADMIT_ENCODE):
+                info = await run_io(stream_embed.embed_stream, cover_path, out_path, full_payload,
+                                    key, nlsb, random_start, fmt, with_psnr, progress=jobs.report)
+    except stego_lsb.CapacityError as e:
+        raise HTTPException(413, str(e).capitalize())
+    except ValueError as e:
+        # header WAV / stream PCM dari ffmpeg tidak valid
+        raise HTTPException(400, f"Failed to decode cover: {e}")
+    finally:
+        await run_io(_remove, cover_path)
+    out_mime, out_name = OUT_FORMATS[fmt]
+    # output bisa sangat besar: format lain tidak tersedia untuk token ini
+    token = await run_io(STEGO_STORE.put_file, out_path, mime=out_mime, filename=out_name, meta={"fmt": fmt})
+    return token, info["size"], info["quality"], [fmt]
+
+async def _embed_work(request: Request, cover: UploadFile, secret: UploadFile, key: str, nlsb: int,
+                      encrypt: bool, random_start: bool, out_format: str, with_psnr: bool,
+                      stream: Optional[bool], compression: str = "none", compression_level: Optional[int] = None,
+                      keep_source: bool = False):
+    """Validasi + baca upload sekarang; kembalikan (coroutine kerja, path spool) untuk dijalankan
+    langsung oleh /embed atau belakangan oleh worker job."""
+    if not (1 <= nlsb <= 8):
+        raise HTTPException(422, "nlsb must be 1..8")
+    fmt = (out_format or "mp3").lower()
+    if fmt not in OUT_FORMATS:
+        raise HTTPException(422, 'out_format must be "wav", "mp3" or "flac"')
+    comp = (compression or "none").lower()
+    if comp != "auto" and comp not in compress.CODECS:
+        raise HTTPException(422, 'compression must be "auto", "none", "zlib", "lzma" or "zstd"')
+    codec = compress.ZLIB if comp == "auto" else compress.CODECS[comp]
+    if not compress.available(codec):
+        raise HTTPException(422, "zstd compression is not available on this server")
+    try:
+        level = compress.level_for(codec, compression_level)
+    except ValueError as e:
+        raise HTTPException(422, str(e))
+    key = key[:25]
+    secret_bytes = await secret.read()
+    secret_name = secret.filename or "secret.bin"
+    if stream is None:
+        # jalur paralel butuh cover di disk, jadi ikut di-spool
+        stream = (cover.size or 0) >= STREAM_THRESHOLD_BYTES or _parallel(fmt, cover.size or 0)
+    if stream:
+        cover_src = await run_io(_spool, cover)
+    else:
+        cover_src = await cover.read()
+    telemetry.observe_size("cover", cover.size or 0)
+    telemetry.observe_size("secret", len(secret_bytes))
+    base = str(request.base_url).rstrip("/")
+
+    async def work() -> dict:
+        # kompres dulu: data acak/terkompresi (auto) atau yang tidak mengecil disimpan apa adanya
+        use = codec if comp != "auto" or compress.worth_it(secret_bytes) else compress.NONE
+        stored, used = await run_cpu(compress.compress, secret_bytes, use, level)
+        payload = await run_cpu(crypto.vig256, stored, key) if encrypt else stored
+        hdr = pack.build(
+            encrypt, random_start, nlsb,
+            size=len(stored),
+            name=secret_name,
+            crc32=await run_cpu(pack.crc32_bytes, secret_bytes),
+            key=key,
+            block_crcs=await run_cpu(pack.block_crcs, stored),
+            codec=used,
+            raw_size=len(secret_bytes),
+        )
+        full_payload = hdr + payload
+        telemetry.observe_size("payload", len(full_payload))
+        run = _embed_streaming if stream else _embed_buffered
+        token, out_size, report, formats = await run(cover_src, full_payload, key, nlsb, random_start, fmt,
+                                                     with_psnr, keep_source)
+        telemetry.observe_size("stego", out_size)
+        resp = _embed_response(base, token, out_size, report, formats)
+        resp["compression"] = compress.NAMES[used]
+        resp["compressionRatio"] = round(len(secret_bytes) / len(stored), 3) if stored else 1.0
+        return resp
+
+    return work, (cover_src if stream else None)
+
+def _embed_response(base: str, token: str, out_size: int, report: Optional[dict], formats: list) -> dict:
+    psnr_db = quality = None
+    if report:
+        psnr_db = report["psnr"]
+        quality = max(0.0, min(100.0, (psnr_db - 20.0) * (100.0 / 40.0)))
+    stego_url = f"{base}/api/download/{token}"
 
     return {
-        "maxCapacityBytes": int(max_bytes),
-        "maxCapacityMB": round(max_bytes / (1024 * 1024), 2),
+        "success": True,
+        "stegoAudioUrl": stego_url,
+        "stegoAudioUrls": {f: f"{stego_url}?format={f}" for f in formats},
+        "stegoAudioBlob": None,
+        "psnr": round(psnr_db, 2) if psnr_db is not None else None,
+        "qualityScore": round(quality, 0) if quality is not None else None,
+        "segSnr": round(report["segSnr"], 2) if report else None,
+        "channelPsnr": [round(c["psnr"], 2) for c in report["channels"]] if report else None,
+        "fileSize": out_size,
+        "message": "OK",
     }
 
 @router.post("/embed")
@@ -67,59 +585,114 @@ async def embed(
     encrypt: bool = Form(False),
     random_start: bool = Form(False),
     out_format: str = Form("mp3"),
+    with_psnr: bool = Form(True),
+    stream: Optional[bool] = Form(None),
+    compression: str = Form("none"),
+    compression_level: Optional[int] = Form(None),
+    keep_source: bool = Form(False),
 ):
-    if not (1 <= nlsb <= 8):
-        raise HTTPException(422, "nlsb must be 1..8")
+    work, spooled = await _embed_work(request, cover, secret, key, nlsb, encrypt, random_start,
+                                      out_format, with_psnr, stream, compression, compression_level, keep_source)
+    try:
+        return await work()
+    finally:
+        if spooled:
+            await run_io(_remove, spooled)
+
+def _open_payload(hdr: pack.Header, payload: bytes, key: str) -> bytes:
+    """Dekripsi + verifikasi. v3 dicek per blok sambil jalan (berhenti di blok rusak pertama);
+    v1/v2 hanya punya satu CRC untuk seluruh plaintext."""
+    if hdr.version < 3:
+        data = crypto.vig256(payload, key, decrypt=True) if hdr.encrypt else payload
+        if pack.crc32_bytes(data) != hdr.crc32:
+            raise HTTPException(400, "Bad key or corrupted data. CRC32 mismatch.")
+        return data
+    dec = crypto.Vig256(key, decrypt=True) if hdr.encrypt else None
+    mv, bs = memoryview(payload), hdr.block_size
+    chunks = (dec.update(mv[i:i + bs]) if dec else bytes(mv[i:i + bs]) for i in range(0, len(mv), bs))
+    try:
+        if not hdr.codec:
+            return b"".join(pack.verified_blocks(hdr, chunks))
+        # blok terverifikasi langsung didekompresi, tanpa menyimpan salinan terkompresi utuh
+        d = compress.Decompressor(hdr.codec, hdr.raw_size)
+        parts = [d.update(c) for c in pack.verified_blocks(hdr, chunks)]
+        parts.append(d.finish())
+        data = b"".join(parts)
+        if len(data) != hdr.raw_size or pack.crc32_bytes(data) != hdr.crc32:
+            raise ValueError("decompressed data CRC32 mismatch")
+        return data
+    except ValueError as e:
+        raise HTTPException(400, f"Corrupted data: {e}.")
+
+async def _extract_work(request: Request, stego: UploadFile, key: str):
     key = key[:25]
-    cover_bytes = await cover.read()
-    secret_bytes = await secret.read()
+    stego_bytes = await stego.read()
+    telemetry.observe_size("stego", len(stego_bytes))
+    base = str(request.base_url).rstrip("/")
 
-    pcm, sr, ch, meta = mp3_io.decode_to_pcm(cover_bytes)
-    cap = metrics.capacity_bytes(len(pcm), ch, nlsb)
+    async def work() -> dict:
+        raw_payload = id3_tags.read_priv(stego_bytes)  # hanya parse header tag, mikrodetik
 
-    payload = crypto.vig256(secret_bytes, key) if encrypt else secret_bytes
-    hdr = pack.build(
-        encrypt, random_start, nlsb,
-        size=len(secret_bytes),
-        name=secret.filename or "secret.bin",
-        crc32=pack.crc32_bytes(secret_bytes),
-    )
-    full_payload = hdr + payload
+        if raw_payload is None:
+            try:
+                pcm, sr, ch, meta = await _decode_admitted(stego_bytes)
+                jobs.report(0.4)
+                # header di sampel 0, atau (random_start) di offset turunan key: dua probe, tanpa scan
+                start_idx = 0
+                found = await run_cpu(header_probe.probe, pcm)
+                if found is None and key:
+                    start_idx = stego_lsb.key_start(key, pcm.size)
+                    found = await run_cpu(header_probe.probe, pcm, start_idx)
+                if found is None:
+                    raise HTTPException(400, "Failed to find a valid header. The audio may be too distorted, the key may be wrong, or no data exists.")
+                hdr, consumed, real_nlsb = found
+                if not pack.check_key(hdr, key):
+                    # v3: kunci salah ketahuan dari header, payload tidak perlu di-extract
+                    raise HTTPException(400, "Bad key. Key verification tag mismatch.")
 
-    if len(full_payload) > cap:
-        raise HTTPException(413, f"Payload exceeds capacity ({len(full_payload)} > {cap})")
+                total_bytes = consumed + hdr.size
+                total_bits = total_bytes * 8
 
-    stego_pcm = stego_lsb.embed(pcm, full_payload, key, nlsb, random_start)
-    mp3_out = mp3_io.encode_from_pcm(stego_pcm, sr, ch, bitrate="320k")
+                raw_payload = await run_cpu(
+                    stego_lsb.extract, pcm, nlsb=real_nlsb, key=key,
+                    random_start=hdr.random_start, total_bits=total_bits, start_hint=start_idx
+                )
 
-    fmt = (out_format or "mp3").lower()
-    if fmt == "wav":
-        out_bytes = mp3_io.encode_wav_from_pcm(stego_pcm, sr, ch)
-        out_mime = "audio/wav"
-        out_name = "stego.wav"
-    elif fmt == "mp3":
-        out_bytes = id3_tags.write_priv(mp3_out, full_payload)
-        out_mime = "audio/mpeg"
-        out_name = "stego.mp3"
-    else:
-        raise HTTPException(422, 'out_format must be "wav" or "mp3"')
+            except HTTPException as e:
+                raise e
+            except Exception as e:
+                raise HTTPException(400, f"Failed to extract from LSBs. Data might be corrupted. Details: {e}")
 
-    psnr_db = metrics.psnr(pcm, stego_pcm)
-    quality = max(0.0, min(100.0, (psnr_db - 20.0) * (100.0 / 40.0)))
+        if raw_payload is None:
+            raise HTTPException(400, "Could not find any hidden data.")
+        jobs.report(0.7)
 
-    token = _put_stego(out_bytes, mime=out_mime, filename=out_name)
-    base = str(request.base_url).rstrip("/")
-    stego_url = f"{base}/api/download/{token}"
+        try:
+            hdr2, consumed2 = pack.parse(raw_payload)
+            if not pack.check_key(hdr2, key):
+                raise HTTPException(400, "Bad key. Key verification tag mismatch.")
+            payload_only = raw_payload[consumed2 : consumed2 + hdr2.size]
+            data_bytes = await run_cpu(_open_payload, hdr2, payload_only, key)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(400, f"Failed to parse payload header. Details: {e}")
 
-    return {
-        "success": True,
-        "stegoAudioUrl": stego_url,
-        "stegoAudioBlob": None,
-        "psnr": round(psnr_db, 2),
-        "qualityScore": round(quality, 0),
-        "fileSize": len(out_bytes),
-        "message": "OK",
-    }
+        mime = mimetypes.guess_type(hdr2.name)[0] or "application/octet-stream"
+        token = await run_io(_put_stego, data_bytes, mime=mime, filename=hdr2.name)
+        file_url = f"{base}/api/download/{token}"
+
+        return {
+            "success": True,
+            "extractedFileUrl": file_url,
+            "extractedFileBlob": None,
+            "originalFileName": hdr2.name,
+            "fileSizeBytes": len(data_bytes),
+            "fileType": mime,
+            "message": "OK",
+        }
+
+    return work
 
 @router.post("/extract")
 async def extract(
@@ -127,77 +700,89 @@ async def extract(
     stego: UploadFile = File(...),
     key: str = Form(...),
 ):
-    key = key[:25]
-    stego_bytes = await stego.read()
+    work = await _extract_work(request, stego, key)
+    return await work()
 
-    raw_payload = None
-    raw_payload = id3_tags.read_priv(stego_bytes)
-    
-    if raw_payload is None:
-        try:
-            pcm, sr, ch, meta = mp3_io.decode_to_pcm(stego_bytes)
-            HEADER_MAX_BYTES = 320
-            start_idx = None
-            hdr = None
-            consumed = None
-            real_nlsb = None
-
-            for nlsb in range(1, 9):
-                samples_for_hdr = (HEADER_MAX_BYTES * 8 + nlsb - 1) // nlsb
-                if len(pcm) < samples_for_hdr: continue
-
-                raw0 = stego_lsb.extract(
-                    pcm[:samples_for_hdr], nlsb=nlsb, key=key,
-                    random_start=False, total_bits=samples_for_hdr * nlsb
-                )
-                try:
-                    h0, c0 = pack.parse(raw0)
-                    if h0.nlsb == nlsb:
-                        hdr, consumed, start_idx, real_nlsb = h0, c0, 0, nlsb
-                        break
-                except Exception:
-                    pass
-
-            if hdr is None:
-                raise HTTPException(400, "Failed to find a valid header. The audio may be too distorted or no data exists.")
-
-            total_bytes = consumed + hdr.size
-            total_bits = total_bytes * 8
-            
-            raw_payload = stego_lsb.extract(
-                pcm[start_idx:], nlsb=real_nlsb, key=key,
-                random_start=False, total_bits=total_bits
-            )
-
-        except HTTPException as e:
-            raise e
-        except Exception as e:
-            raise HTTPException(400, f"Failed to extract from LSBs. Data might be corrupted. Details: {e}")
+def _job_view(job: jobs.Job) -> dict:
+    view = job.to_dict()
+    view["queuePosition"] = JOBS.position(job)
+    return view
+
+def _submit(request: Request, kind: str, work, priority: int, spooled: Optional[str] = None) -> dict:
+    # closure `work` memegang isi upload sampai job selesai: byte upload tetap dihitung ke gate
+    release = detach_upload(request)
 
-    if raw_payload is None:
-        raise HTTPException(400, "Could not find any hidden data.")
+    def cleanup():
+        try:
+            if spooled:
+                _remove(spooled)
+        finally:
+            if release is not None:
+                release()
 
     try:
-        hdr2, consumed2 = pack.parse(raw_payload)
-        payload_only = raw_payload[consumed2 : consumed2 + hdr2.size]
+        job = JOBS.submit(kind, work, priority=priority, cleanup=cleanup)
+    except jobs.QueueFull:
+        cleanup()
+        raise HTTPException(503, "Job queue is full", headers={"Retry-After": str(JOB_RETRY_AFTER_SEC)})
+    return _job_view(job)
 
-        data_bytes = crypto.vig256(payload_only, key, decrypt=True) if hdr2.encrypt else payload_only
-        if pack.crc32_bytes(data_bytes) != hdr2.crc32:
-            raise HTTPException(400, "Bad key or corrupted data. CRC32 mismatch.")
-    except Exception as e:
-        raise HTTPException(400, f"Failed to parse payload header. Details: {e}")
+@router.post("/jobs/embed", status_code=202)
+async def submit_embed(
+    request: Request,
+    cover: UploadFile = File(...),
+    secret: UploadFile = File(...),
+    key: str = Form(...),
+    nlsb: int = Form(...),
+    encrypt: bool = Form(False),
+    random_start: bool = Form(False),
+    out_format: str = Form("mp3"),
+    with_psnr: bool = Form(True),
+    stream: Optional[bool] = Form(None),
+    compression: str = Form("none"),
+    compression_level: Optional[int] = Form(None),
+    keep_source: bool = Form(False),
+    priority: int = Form(0, ge=-JOB_PRIORITY_MAX, le=JOB_PRIORITY_MAX),
+):
+    """Sama dengan /embed, tapi dijalankan worker job; poll GET /jobs/{id} untuk status & hasil."""
+    work, spooled = await _embed_work(request, cover, secret, key, nlsb, encrypt, random_start,
+                                      out_format, with_psnr, stream, compression, compression_level, keep_source)
+    return _submit(request, "embed", work, priority, spooled)
 
-    mime = mimetypes.guess_type(hdr2.name)[0] or "application/octet-stream"
-    token = _put_stego(data_bytes, mime=mime, filename=hdr2.name)
-    base = str(request.base_url).rstrip("/")
-    file_url = f"{base}/api/download/{token}"
+@router.post("/jobs/extract", status_code=202)
+async def submit_extract(
+    request: Request,
+    stego: UploadFile = File(...),
+    key: str = Form(...),
+    priority: int = Form(0, ge=-JOB_PRIORITY_MAX, le=JOB_PRIORITY_MAX),
+):
+    work = await _extract_work(request, stego, key)
+    return _submit(request, "extract", work, priority)
 
-    return {
-        "success": True,
-        "extractedFileUrl": file_url,
-        "extractedFileBlob": None,
-        "originalFileName": hdr2.name,
-        "fileSizeBytes": len(data_bytes),
-        "fileType": mime,
-        "message": "OK",
-    }
\ No newline at end of file
+@router.get("/jobs/stats")
+def job_stats():
+    return JOBS.stats()
+
+def _remote_job(job_id: str) -> dict:
+    """Job milik worker lain: status terakhir yang ditulis ke store (progress hanya per transisi)."""
+    view = STEGO_STORE.get_record("job", job_id)
+    if view is None:
+        raise HTTPException(404, "Job not found")
+    return {**view, "queuePosition": None}
+
+@router.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = JOBS.get(job_id)
+    if job is None:
+        return _remote_job(job_id)
+    return _job_view(job)
+
+@router.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    job = JOBS.get(job_id)
+    if job is None:
+        view = _remote_job(job_id)
+        raise HTTPException(409, f"Job is {view['status']} on another worker process, cancel it there")
+    if not JOBS.cancel(job_id):
+        raise HTTPException(409, f"Job is {job.status}, only queued jobs can be cancelled")
+    return _job_view(job)
@@ -0,0 +1,172 @@
+# app/utils/admission.py
+import asyncio, time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Callable, Optional
+from starlette.responses import JSONResponse
+
+class Overloaded(Exception):
+    """Antrian gate penuh atau waktu tunggu habis -> klien disuruh coba lagi (429)."""
+
+    def __init__(self, gate: str, retry_after: int):
+        super().__init__(f"{gate} busy")
+        self.gate = gate
+        self.retry_after = retry_after
+
+class Gate:
+    """Semaphore berbobot dengan antrian tunggu pendek, FIFO.
+
+    Bobot 1 untuk membatasi jumlah proses (decode/encode), atau byte untuk
+    membatasi total upload in-flight. Permintaan yang tidak langsung dapat
+    slot menunggu paling lama `max_wait` detik di antrian yang panjangnya
+    paling banyak `max_waiters`; selebihnya Overloaded. capacity <= 0 = tanpa batas.
+    """
+
+    def __init__(self, name: str, capacity: int, max_waiters: int = 16, max_wait: float = 10.0,
+                 retry_after: int = 2):
+        self.name = name
+        self.capacity = capacity
+        self.max_waiters = max_waiters
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self.in_use = 0
+        self._waiters: deque = deque()
+        self.admitted = self.rejected = self.waited = 0
+        self.wait_total = self.wait_max = 0.0
+
+    def _weight(self, weight: int) -> int:
+        # satu permintaan lebih besar dari kapasitas tetap boleh jalan, sendirian
+        return max(1, min(weight, self.capacity))
+
+    async def acquire(self, weight: int = 1, max_wait: Optional[float] = -1) -> None:
+        """max_wait=None: tunggu tanpa batas (dipakai worker job); -1: default gate."""
+        if self.capacity <= 0:
+            return
+        w = self._weight(weight)
+        if not self._waiters and self.in_use + w <= self.capacity:
+            self.in_use += w
+            self.admitted += 1
+            return
+        if max_wait is not None and len(self._waiters) >= self.max_waiters:
+            self.rejected += 1
+            raise Overloaded(self.name, self.retry_after)
+        fut = asyncio.get_running_loop().create_future()
+        item = (w, fut)
+        self._waiters.append(item)
+        t0 = time.perf_counter()
+        timeout = self.max_wait if max_wait == -1 else max_wait
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if fut.done() and not fut.cancelled():
+                self.release(w)  # slot sudah diberikan tepat saat timeout
+            else:
+                fut.cancel()
+                try: self._waiters.remove(item)
+                except ValueError: pass
+                self._wake()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.rejected += 1
+            raise Overloaded(self.name, self.retry_after) from None
+        finally:
+            dt = time.perf_counter() - t0
+            self.waited += 1
+            self.wait_total += dt
+            self.wait_max = max(self.wait_max, dt)
+        self.admitted += 1
+
+    def release(self, weight: int = 1) -> None:
+        if self.capacity <= 0:
+            return
+        self.in_use -= self._weight(weight)
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters:
+            w, fut = self._waiters[0]
+            if fut.cancelled():
+                self._waiters.popleft()
+                continue
+            if self.in_use + w > self.capacity:
+                return
+            self._waiters.popleft()
+            self.in_use += w
+            fut.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, weight: int = 1, max_wait: Optional[float] = -1):
+        await self.acquire(weight, max_wait)
+        try:
+            yield
+        finally:
+            self.release(weight)
+
+    def stats(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "inUse": self.in_use,
+            "queueDepth": len(self._waiters),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "waited": self.waited,
+            "waitSecondsTotal": round(self.wait_total, 6),
+            "waitSecondsMax": round(self.wait_max, 6),
+        }
+
+class _Charge:
+    """Byte upload yang sedang dihitung ke gate; release() idempoten."""
+
+    def __init__(self, gate: Gate, weight: int):
+        self.gate = gate
+        self.weight = weight
+        self.detached = False
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self.gate.release(self.weight)
+
+def detach_upload(request) -> Optional[Callable[[], None]]:
+    """Ambil alih byte upload request ini dari middleware: tidak dilepas saat response
+    selesai, tapi saat callable yang dikembalikan dipanggil (mis. cleanup job async
+    yang masih memegang isi upload). None kalau request tidak dihitung ke gate."""
+    charge = request.scope.get("state", {}).get("upload_charge")
+    if charge is None:
+        return None
+    charge.detached = True
+    return charge.release
+
+class UploadAdmission:
+    """Middleware ASGI: POST dengan body dihitung ke gate byte (Content-Length) sebelum
+    body dibaca, dan dilepas setelah response selesai (kecuali di-detach_upload).
+    Penuh -> 429 + Retry-After."""
+
+    def __init__(self, app, gate: Gate, prefix: str = "/api/"):
+        self.app = app
+        self.gate = gate
+        self.prefix = prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].startswith(self.prefix):
+            return await self.app(scope, receive, send)
+        length = 1
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                try: length = max(1, int(value))
+                except ValueError: pass
+                break
+        try:
+            await self.gate.acquire(length)
+        except Overloaded as e:
+            resp = JSONResponse({"detail": "Server busy, too many uploads in flight. Retry later."},
+                                status_code=429, headers={"Retry-After": str(e.retry_after)})
+            return await resp(scope, receive, send)
+        charge = _Charge(self.gate, length)
+        scope.setdefault("state", {})["upload_charge"] = charge
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if not charge.detached:
+                charge.release()
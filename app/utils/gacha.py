@@ -7,3 +7,10 @@ def seed_from_key(key: str) -> int:
 
 def rng_from_key(key: str) -> random.Random:
     return random.Random(seed_from_key(key))
+
+def offset_from_key(key: str, n: int) -> int:
+    """Indeks deterministik 0..n-1 dari key (hash 64-bit, bukan state random.Random)."""
+    if n <= 0:
+        return 0
+    h = hashlib.blake2b(key.encode("utf-8"), digest_size=8, person=b"btfy-offset").digest()
+    return int.from_bytes(h, "little") % n
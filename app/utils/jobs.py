@@ -0,0 +1,187 @@
+# app/utils/jobs.py
+import asyncio, contextvars, itertools, time, uuid
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    priority: int
+    created: float
+    status: str = QUEUED
+    progress: float = 0.0
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    result: Optional[dict] = None
+    error: Optional[dict] = None
+    work: Optional[Callable[[], Awaitable[dict]]] = field(default=None, repr=False)
+    cleanup: Optional[Callable[[], None]] = field(default=None, repr=False)
+
+    def to_dict(self) -> dict:
+        return {
+            "jobId": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": round(self.progress, 3),
+            "priority": self.priority,
+            "createdAt": self.created,
+            "startedAt": self.started,
+            "finishedAt": self.finished,
+            "result": self.result,
+            "error": self.error,
+        }
+
+_current: contextvars.ContextVar[Optional[Job]] = contextvars.ContextVar("bitify_job", default=None)
+
+def current() -> Optional[Job]:
+    return _current.get()
+
+def report(fraction: float) -> None:
+    """Laporkan progress (0..1) job yang sedang jalan; no-op di luar job.
+
+    Aman dipanggil dari thread pool: run_cpu/run_io membawa contextvars.
+    """
+    job = _current.get()
+    if job is not None:
+        job.progress = max(job.progress, min(1.0, fraction))
+
+class QueueFull(Exception):
+    pass
+
+class JobQueue:
+    """Antrian job in-process: prioritas lebih tinggi duluan, FIFO untuk prioritas sama.
+
+    `workers` coroutine mengambil job satu per satu, jadi paling banyak
+    `workers` job berat berjalan bersamaan; sisanya menunggu di antrian
+    (maks `max_queued`). Job selesai disimpan `ttl_sec` untuk di-poll.
+
+    `on_change` (coroutine) menerima snapshot to_dict() tiap transisi status.
+    Snapshot diantrikan dan dikirim satu per satu oleh satu task, jadi
+    penulisan yang blocking tidak dijalankan di event loop dan urutannya terjaga.
+    """
+
+    def __init__(self, workers: int = 2, max_queued: int = 64, ttl_sec: float = 300,
+                 on_change: Optional[Callable[[dict], Awaitable[None]]] = None):
+        self.workers = workers
+        self.on_change = on_change
+        self.max_queued = max_queued
+        self.ttl_sec = ttl_sec
+        self._jobs: dict[str, Job] = {}
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._seq = itertools.count()
+        self._tasks: list[asyncio.Task] = []
+        self._changes: Optional[asyncio.Queue] = None
+        self._publisher: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._queue = asyncio.PriorityQueue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if self.on_change is not None:
+            self._changes = asyncio.Queue()
+            self._publisher = asyncio.create_task(self._publish())
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for job in self._jobs.values():
+            if job.status == QUEUED:
+                self._finish(job, CANCELLED)
+        if self._publisher is not None:
+            await self._changes.join()  # status akhir sempat tertulis sebelum berhenti
+            self._publisher.cancel()
+            await asyncio.gather(self._publisher, return_exceptions=True)
+            self._publisher = self._changes = None
+
+    def submit(self, kind: str, work: Callable[[], Awaitable[dict]], priority: int = 0,
+               cleanup: Optional[Callable[[], None]] = None) -> Job:
+        self._prune()
+        if self._queue is None:
+            raise RuntimeError("job queue not started")
+        if self._queue.qsize() >= self.max_queued:
+            raise QueueFull
+        job = Job(id=uuid.uuid4().hex, kind=kind, priority=priority, created=time.time(),
+                  work=work, cleanup=cleanup)
+        self._jobs[job.id] = job
+        self._queue.put_nowait((-priority, next(self._seq), job.id))
+        self._changed(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def position(self, job: Job) -> Optional[int]:
+        """Jumlah job antri yang akan jalan lebih dulu (0 = berikutnya)."""
+        if job.status != QUEUED:
+            return None
+        ahead = (-job.priority, job.created)
+        return sum(1 for j in self._jobs.values()
+                   if j.status == QUEUED and j is not job and (-j.priority, j.created) <= ahead)
+
+    def cancel(self, job_id: str) -> bool:
+        """Batalkan job yang masih antri; job yang sudah jalan tidak bisa dihentikan."""
+        job = self._jobs.get(job_id)
+        if job is None or job.status != QUEUED:
+            return False
+        self._finish(job, CANCELLED)
+        return True
+
+    def stats(self) -> dict:
+        counts = {s: 0 for s in (QUEUED, RUNNING, DONE, FAILED, CANCELLED)}
+        for job in self._jobs.values():
+            counts[job.status] += 1
+        return {"workers": self.workers, "maxQueued": self.max_queued, **counts}
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, job_id = await self._queue.get()
+            job = self._jobs.get(job_id)
+            if job is None or job.status != QUEUED:
+                continue  # dibatalkan / sudah di-prune
+            job.status, job.started = RUNNING, time.time()
+            self._changed(job)
+            token = _current.set(job)
+            try:
+                result = await job.work()
+            except asyncio.CancelledError:
+                self._finish(job, CANCELLED)
+                raise
+            except Exception as e:
+                status = getattr(e, "status_code", 500)
+                detail = getattr(e, "detail", None) or f"{type(e).__name__}: {e}"
+                job.error = {"status": status, "detail": detail}
+                self._finish(job, FAILED)
+            else:
+                job.result, job.progress = result, 1.0
+                self._finish(job, DONE)
+            finally:
+                _current.reset(token)
+
+    def _finish(self, job: Job, status: str) -> None:
+        job.status, job.finished = status, time.time()
+        job.work = None
+        if job.cleanup is not None:
+            cleanup, job.cleanup = job.cleanup, None
+            try: cleanup()
+            except OSError: pass
+        self._changed(job)
+
+    def _changed(self, job: Job) -> None:
+        if self._changes is not None:
+            self._changes.put_nowait(job.to_dict())
+
+    async def _publish(self) -> None:
+        while True:
+            view = await self._changes.get()
+            try: await self.on_change(view)
+            except OSError: pass
+            finally: self._changes.task_done()
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.ttl_sec
+        for job_id in [k for k, j in self._jobs.items() if j.finished is not None and j.finished < cutoff]:
+            del self._jobs[job_id]
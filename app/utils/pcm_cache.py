@@ -0,0 +1,112 @@
+# app/utils/pcm_cache.py
+import hashlib, os, threading
+from collections import OrderedDict
+from typing import Callable, Optional
+import numpy as np
+
+def content_key(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+class PcmCache:
+    """LRU hasil decode (pcm, sr, ch, meta) per hash isi upload, dibatasi total byte PCM.
+
+    Kalau mmap_dir di-set, PCM disimpan sebagai .npy di disk lokal dan dibuka
+    dengan np.load(mmap_mode="r") sehingga tidak dihitung ke RAM proses.
+    Array yang dikembalikan read-only: pemakai harus menyalin sebelum mengubah.
+    """
+
+    def __init__(self, max_bytes: int = 256 << 20, mmap_dir: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.mmap_dir = mmap_dir
+        self._items: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key: str):
+        """Hasil decode yang sudah ada (key = content_key(data)) tanpa decode; None kalau belum."""
+        return self._get(key)
+
+    def get_or_decode(self, data: bytes, decode: Callable, key: Optional[str] = None):
+        if self.max_bytes <= 0:
+            return decode(data)
+        key = key or content_key(data)
+        hit = self._get(key)
+        if hit is not None:
+            return hit
+        # decode yang sama sedang berjalan di thread lain -> tunggu, jangan decode dua kali
+        with self._lock:
+            flight = self._inflight.setdefault(key, threading.Lock())
+        with flight:
+            hit = self._get(key)
+            if hit is not None:
+                return hit
+            with self._lock:
+                self.misses += 1
+            try:
+                pcm, sr, ch, meta = decode(data)
+                return self._put(key, pcm, sr, ch, meta)
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._items),
+                "bytes": self.bytes,
+                "maxBytes": self.max_bytes,
+                "mmap": self.mmap_dir is not None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._items):
+                self._drop(key)
+
+    def _get(self, key: str):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item
+
+    def _put(self, key: str, pcm: np.ndarray, sr: int, ch: int, meta: dict):
+        if self.mmap_dir:
+            os.makedirs(self.mmap_dir, exist_ok=True)
+            path = os.path.join(self.mmap_dir, key + ".npy")
+            tmp = path + ".part"
+            with open(tmp, "wb") as f:
+                np.save(f, pcm)
+            os.replace(tmp, path)
+            pcm = np.load(path, mmap_mode="r")
+        else:
+            pcm.setflags(write=False)
+        item = (pcm, sr, ch, meta)
+        if pcm.nbytes > self.max_bytes:
+            self._unlink(key)
+            return item
+        with self._lock:
+            self._items[key] = item
+            self.bytes += pcm.nbytes
+            while self.bytes > self.max_bytes:
+                oldest = next(iter(self._items))
+                self._drop(oldest)
+                self.evictions += 1
+        return item
+
+    def _drop(self, key: str) -> None:
+        pcm = self._items.pop(key)[0]
+        self.bytes -= pcm.nbytes
+        self._unlink(key)
+
+    def _unlink(self, key: str) -> None:
+        if self.mmap_dir:
+            try: os.remove(os.path.join(self.mmap_dir, key + ".npy"))
+            except OSError: pass
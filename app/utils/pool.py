@@ -0,0 +1,58 @@
+# app/utils/pool.py
+import asyncio, contextvars, functools, os
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Optional
+from app.utils import telemetry
+
+# CPU_POOL_KIND=process memindahkan NumPy/Python loop ke proses lain (lepas dari GIL),
+# dengan biaya pickle array PCM antar proses. Default thread: NumPy & zlib melepas GIL.
+CPU_POOL_KIND = os.getenv("CPU_POOL_KIND", "thread")
+CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", str(os.cpu_count() or 2)))
+# ffmpeg subprocess + I/O file: thread cukup, yang kerja proses ffmpeg-nya
+IO_POOL_WORKERS = int(os.getenv("IO_POOL_WORKERS", str(2 * (os.cpu_count() or 2))))
+
+_cpu: Optional[Executor] = None
+_io: Optional[Executor] = None
+
+def _cpu_pool() -> Executor:
+    global _cpu
+    if _cpu is None:
+        if CPU_POOL_KIND == "process":
+            _cpu = ProcessPoolExecutor(max_workers=CPU_POOL_WORKERS)
+        else:
+            _cpu = ThreadPoolExecutor(max_workers=CPU_POOL_WORKERS, thread_name_prefix="bitify-cpu")
+    return _cpu
+
+def _io_pool() -> Executor:
+    global _io
+    if _io is None:
+        _io = ThreadPoolExecutor(max_workers=IO_POOL_WORKERS, thread_name_prefix="bitify-io")
+    return _io
+
+def _submit(ex: Executor, fn, args, kwargs):
+    call = functools.partial(fn, *args, **kwargs)
+    if isinstance(ex, ThreadPoolExecutor):
+        # bawa contextvars request ke thread worker
+        call = functools.partial(contextvars.copy_context().run, call)
+    return asyncio.get_running_loop().run_in_executor(ex, call)
+
+async def run_cpu(fn, *args, **kwargs):
+    """Jalankan tahap CPU-bound (embed/extract/crypto/psnr) di luar event loop."""
+    ex = _cpu_pool()
+    name = getattr(fn, "__stage__", None)
+    if name and isinstance(ex, ProcessPoolExecutor):
+        # timing yang dicatat di proses worker tidak sampai ke sini; ukur dari sisi pemanggil
+        with telemetry.stage(name):
+            return await _submit(ex, fn, args, kwargs)
+    return await _submit(ex, fn, args, kwargs)
+
+async def run_io(fn, *args, **kwargs):
+    """Jalankan tahap blocking (ffmpeg, mutagen/tempfile) di luar event loop."""
+    return await _submit(_io_pool(), fn, args, kwargs)
+
+def shutdown() -> None:
+    global _cpu, _io
+    for ex in (_cpu, _io):
+        if ex is not None:
+            ex.shutdown(wait=False, cancel_futures=True)
+    _cpu = _io = None
@@ -0,0 +1,372 @@
+# app/utils/store.py
+import asyncio, fcntl, json, os, re, shutil, tempfile, threading, time, uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+
+@dataclass
+class Entry:
+    mime: str
+    filename: str
+    size: int
+    expires: float
+    data: Optional[bytes] = None   # blob di RAM
+    path: Optional[str] = None     # blob yang di-spill ke disk
+    meta: dict = field(default_factory=dict)
+
+    def read(self) -> bytes:
+        if self.data is not None:
+            return self.data
+        with open(self.path, "rb") as f:
+            return f.read()
+
+class ResultStore:
+    """Penyimpanan hasil embed/extract per token: LRU ber-budget byte + spill ke disk.
+
+    Blob >= spill_threshold ditulis ke spill_dir; budget RAM dan disk dihitung
+    terpisah dan yang paling lama tidak diakses dibuang duluan. Entri expired
+    dibersihkan oleh run_expiry(), bukan saat put.
+    """
+
+    def __init__(self, ttl_sec: float = 300, max_bytes: int = 512 << 20,
+                 spill_dir: Optional[str] = None, spill_threshold: int = 8 << 20,
+                 spill_max_bytes: int = 4 << 30):
+        self.ttl_sec = ttl_sec
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir or os.path.join(tempfile.gettempdir(), "bitify-store")
+        self.spill_threshold = spill_threshold
+        self.spill_max_bytes = spill_max_bytes
+        self._items: "OrderedDict[str, Entry]" = OrderedDict()
+        self._records: dict[tuple[str, str], tuple[float, dict]] = {}
+        self._lock = threading.Lock()
+        self.resident_bytes = 0
+        self.spilled_bytes = 0
+        self.hits = self.misses = self.evictions = self.expired = 0
+
+    def put(self, data: bytes, mime: str, filename: str, meta: Optional[dict] = None) -> str:
+        token = uuid.uuid4().hex
+        entry = Entry(mime=mime, filename=filename, size=len(data),
+                      expires=time.time() + self.ttl_sec, meta=meta or {})
+        if self.spill_dir and len(data) >= self.spill_threshold:
+            entry.path = self._spill(token, data)
+        else:
+            entry.data = bytes(data)
+        with self._lock:
+            self._items[token] = entry
+            self._account(entry, +1)
+            self._evict(keep=token)
+        return token
+
+    def put_file(self, path: str, mime: str, filename: str, meta: Optional[dict] = None) -> str:
+        """Adopsi file hasil (mis. output embed streaming) ke spill_dir tanpa membacanya ke RAM."""
+        token = uuid.uuid4().hex
+        os.makedirs(self.spill_dir, exist_ok=True)
+        dst = os.path.join(self.spill_dir, token)
+        try:
+            os.replace(path, dst)
+        except OSError:  # beda filesystem
+            shutil.copyfile(path, dst + ".part")
+            os.replace(dst + ".part", dst)
+            os.remove(path)
+        entry = Entry(mime=mime, filename=filename, size=os.path.getsize(dst),
+                      expires=time.time() + self.ttl_sec, path=dst, meta=meta or {})
+        with self._lock:
+            self._items[token] = entry
+            self._account(entry, +1)
+            self._evict(keep=token)
+        return token
+
+    def update_meta(self, token: str, meta: dict) -> None:
+        with self._lock:
+            entry = self._items.get(token)
+            if entry is not None:
+                entry.meta = meta
+
+    def put_record(self, kind: str, key: str, record: dict) -> None:
+        """Dokumen kecil (mis. status job) yang ikut TTL store."""
+        with self._lock:
+            self._records[(kind, key)] = (time.time() + self.ttl_sec, record)
+
+    def get_record(self, kind: str, key: str) -> Optional[dict]:
+        with self._lock:
+            item = self._records.get((kind, key))
+        return item[1] if item is not None and item[0] >= time.time() else None
+
+    def get(self, token: str) -> Optional[Entry]:
+        with self._lock:
+            entry = self._items.get(token)
+            if entry is None or entry.expires < time.time():
+                self.misses += 1
+                return None
+            self._items.move_to_end(token)
+            self.hits += 1
+            return entry
+
+    def sweep(self) -> int:
+        now = time.time()
+        with self._lock:
+            dead = [k for k, v in self._items.items() if v.expires < now]
+            for k in dead:
+                self._drop(k)
+            self.expired += len(dead)
+            for k in [k for k, (exp, _) in self._records.items() if exp < now]:
+                del self._records[k]
+        return len(dead)
+
+    async def run_expiry(self, interval: float = 30.0) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            self.sweep()
+
+    def clear(self) -> None:
+        with self._lock:
+            for k in list(self._items):
+                self._drop(k)
+
+    def close(self) -> None:
+        """Dipanggil saat proses berhenti: isi store memori ikut hilang."""
+        self.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "entries": len(self._items),
+                "residentBytes": self.resident_bytes,
+                "spilledBytes": self.spilled_bytes,
+                "maxBytes": self.max_bytes,
+                "spillMaxBytes": self.spill_max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expired": self.expired,
+            }
+
+    def _spill(self, token: str, data: bytes) -> str:
+        os.makedirs(self.spill_dir, exist_ok=True)
+        path = os.path.join(self.spill_dir, token)
+        tmp = path + ".part"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        return path
+
+    def _account(self, entry: Entry, sign: int) -> None:
+        if entry.path is not None:
+            self.spilled_bytes += sign * entry.size
+        else:
+            self.resident_bytes += sign * entry.size
+
+    def _drop(self, token: str) -> None:
+        entry = self._items.pop(token)
+        self._account(entry, -1)
+        if entry.path is not None:
+            try: os.remove(entry.path)
+            except OSError: pass
+
+    def _evict(self, keep: str) -> None:
+        # LRU: OrderedDict urut dari yang paling lama tidak diakses
+        for token in list(self._items):
+            if self.resident_bytes <= self.max_bytes and self.spilled_bytes <= self.spill_max_bytes:
+                break
+            if token == keep:
+                continue
+            entry = self._items[token]
+            over_ram = entry.path is None and self.resident_bytes > self.max_bytes
+            over_disk = entry.path is not None and self.spilled_bytes > self.spill_max_bytes
+            if over_ram or over_disk:
+                self._drop(token)
+                self.evictions += 1
+
+_TOKEN = re.compile(r"[0-9a-f]{32}")
+
+class FileStore:
+    """Store bersama di filesystem lokal untuk uvicorn --workers N.
+
+    Tiap entri = blob `<token>` + metadata `<token>.json` (mime, nama, ukuran,
+    expires, meta). Keduanya ditulis ke .part lalu os.replace, dan metadata
+    ditulis terakhir, jadi worker lain tidak pernah melihat entri setengah jadi.
+    mtime metadata di-touch tiap get sebagai jejak LRU. Pembersihan expired dan
+    budget byte dilakukan sweep(); flock memastikan hanya satu worker yang
+    menyapu pada satu waktu.
+    """
+
+    def __init__(self, root: str, ttl_sec: float = 300, max_bytes: int = 4 << 30):
+        self.root = root
+        # spool upload / workspace job yang masih antri atau jalan: subdirektori yang tidak disapu
+        # (job bisa menunggu jauh lebih lama dari TTL); filesystem sama supaya hasil bisa di-rename
+        self.spill_dir = os.path.join(root, "_work")
+        self.ttl_sec = ttl_sec
+        self.max_bytes = max_bytes
+        self._rec_dir = os.path.join(root, "_records")
+        os.makedirs(self._rec_dir, exist_ok=True)
+        os.makedirs(self.spill_dir, exist_ok=True)
+        self.hits = self.misses = self.evictions = self.expired = 0
+
+    def _blob(self, token: str) -> str:
+        return os.path.join(self.root, token)
+
+    def _meta_path(self, token: str) -> str:
+        return os.path.join(self.root, token + ".json")
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes) -> None:
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _commit(self, token: str, size: int, mime: str, filename: str, meta: Optional[dict]) -> str:
+        doc = {"mime": mime, "filename": filename, "size": size,
+               "expires": time.time() + self.ttl_sec, "meta": meta or {}}
+        self._write_atomic(self._meta_path(token), json.dumps(doc).encode())
+        return token
+
+    def put(self, data: bytes, mime: str, filename: str, meta: Optional[dict] = None) -> str:
+        token = uuid.uuid4().hex
+        self._write_atomic(self._blob(token), data)
+        return self._commit(token, len(data), mime, filename, meta)
+
+    def put_file(self, path: str, mime: str, filename: str, meta: Optional[dict] = None) -> str:
+        token = uuid.uuid4().hex
+        dst = self._blob(token)
+        try:
+            os.replace(path, dst)
+        except OSError:  # beda filesystem
+            shutil.copyfile(path, dst + ".part")
+            os.replace(dst + ".part", dst)
+            os.remove(path)
+        return self._commit(token, os.path.getsize(dst), mime, filename, meta)
+
+    def get(self, token: str) -> Optional[Entry]:
+        doc = self._load(token)
+        if doc is None or doc["expires"] < time.time():
+            self.misses += 1
+            return None
+        try: os.utime(self._meta_path(token))
+        except OSError: pass
+        self.hits += 1
+        return Entry(mime=doc["mime"], filename=doc["filename"], size=doc["size"],
+                     expires=doc["expires"], path=self._blob(token), meta=doc["meta"])
+
+    def update_meta(self, token: str, meta: dict) -> None:
+        doc = self._load(token)
+        if doc is not None:
+            doc["meta"] = meta
+            self._write_atomic(self._meta_path(token), json.dumps(doc).encode())
+
+    def put_record(self, kind: str, key: str, record: dict) -> None:
+        doc = {"expires": time.time() + self.ttl_sec, "record": record}
+        self._write_atomic(os.path.join(self._rec_dir, f"{kind}-{key}.json"), json.dumps(doc).encode())
+
+    def get_record(self, kind: str, key: str) -> Optional[dict]:
+        if not _TOKEN.fullmatch(key):
+            return None
+        try:
+            with open(os.path.join(self._rec_dir, f"{kind}-{key}.json"), "rb") as f:
+                doc = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return doc["record"] if doc["expires"] >= time.time() else None
+
+    def _load(self, token: str) -> Optional[dict]:
+        if not _TOKEN.fullmatch(token):
+            return None
+        try:
+            with open(self._meta_path(token), "rb") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _remove(self, token: str) -> None:
+        for p in (self._meta_path(token), self._blob(token)):  # metadata dulu: entri langsung tidak terlihat
+            try: os.remove(p)
+            except OSError: pass
+
+    def sweep(self) -> int:
+        """Buang entri expired, lalu entri LRU sampai total blob <= max_bytes. Aman lintas proses."""
+        with open(os.path.join(self.root, ".sweep.lock"), "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return 0  # worker lain sedang menyapu
+            try:
+                return self._sweep()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _sweep(self) -> int:
+        now = time.time()
+        live, dead = [], 0
+        # sisa tulis yang gagal (.part, blob tanpa metadata) dibuang setelah cukup tua;
+        # hanya file langsung di root, spill_dir (subdirektori) tidak disentuh
+        stale = now - max(self.ttl_sec, 3600)
+        with os.scandir(self.root) as it:
+            files = {e.name: e for e in it if e.is_file() and not e.name.startswith(".")}
+        for name, e in files.items():
+            if name.endswith(".json") and _TOKEN.fullmatch(name[:-5]):
+                token = name[:-5]
+                doc = self._load(token)
+                if doc is None or doc["expires"] < now:
+                    self._remove(token)
+                    dead += 1
+                else:
+                    blob = files.get(token)
+                    live.append((e.stat().st_mtime, token, blob.stat().st_size if blob else 0))
+            elif not (_TOKEN.fullmatch(name) and name + ".json" in files):
+                try:
+                    if e.stat().st_mtime < stale:
+                        os.remove(e.path)
+                except OSError:
+                    pass
+        with os.scandir(self._rec_dir) as it:
+            for e in it:
+                try:
+                    with open(e.path, "rb") as f:
+                        if json.load(f)["expires"] < now:
+                            os.remove(e.path)
+                except (OSError, ValueError, KeyError):
+                    pass
+        self.expired += dead
+        total = sum(size for _, _, size in live)
+        for _, token, size in sorted(live):
+            if total <= self.max_bytes:
+                break
+            self._remove(token)
+            total -= size
+            self.evictions += 1
+        return dead
+
+    async def run_expiry(self, interval: float = 30.0) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.get_running_loop().run_in_executor(None, self.sweep)
+
+    def clear(self) -> None:
+        for name in os.listdir(self.root):
+            if name.endswith(".json") and _TOKEN.fullmatch(name[:-5]):
+                self._remove(name[:-5])
+
+    def close(self) -> None:
+        """Isi store dipakai worker lain; biarkan sampai expired."""
+
+    def stats(self) -> dict:
+        entries = size = 0
+        with os.scandir(self.root) as it:
+            names = {e.name: e for e in it if e.is_file()}
+        for name in names:
+            if name.endswith(".json") and name[:-5] in names:
+                entries += 1
+                size += names[name[:-5]].stat().st_size
+        return {
+            "backend": "fs",
+            "entries": entries,
+            "residentBytes": 0,
+            "spilledBytes": size,
+            "maxBytes": self.max_bytes,
+            "spillMaxBytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expired": self.expired,
+        }
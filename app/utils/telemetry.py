@@ -0,0 +1,213 @@
+# app/utils/telemetry.py
+import bisect, contextvars, functools, os, sys, threading, time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+BYTE_BUCKETS = tuple(1 << s for s in range(10, 32, 2))  # 1 KB .. 1 GB, kelipatan 4
+
+class Histogram:
+    """Histogram kumulatif gaya Prometheus, satu seri per kombinasi label."""
+
+    def __init__(self, name: str, help: str, buckets: tuple, labels: tuple = ()):
+        self.name, self.help, self.buckets, self.labels = name, help, buckets, labels
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(label_values)
+            if s is None:
+                s = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            s[0][i] += 1
+            s[1] += value
+            s[2] += 1
+
+    def render(self) -> list:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, [list(v[0]), v[1], v[2]]) for k, v in self._series.items())
+        for values, (counts, total, n) in items:
+            lbl = [f'{k}="{v}"' for k, v in zip(self.labels, values)]
+            acc = 0
+            for le, c in zip((*self.buckets, "+Inf"), counts):
+                acc += c
+                le_lbl = 'le="%s"' % le
+                out.append(f'{self.name}_bucket{{{",".join([*lbl, le_lbl])}}} {acc}')
+            tail = "{" + ",".join(lbl) + "}" if lbl else ""
+            out.append(f"{self.name}_sum{tail} {total}")
+            out.append(f"{self.name}_count{tail} {n}")
+        return out
+
+STAGE_SECONDS = Histogram("bitify_stage_seconds", "Durasi per tahap pemrosesan.", STAGE_BUCKETS, ("stage",))
+REQUEST_SECONDS = Histogram("bitify_request_seconds", "Durasi request HTTP.", STAGE_BUCKETS,
+                            ("method", "route", "status"))
+SIZE_BYTES = Histogram("bitify_size_bytes", "Ukuran cover/payload/output yang diproses.", BYTE_BUCKETS, ("kind",))
+_HISTOGRAMS = [STAGE_SECONDS, REQUEST_SECONDS, SIZE_BYTES]
+
+# gauge dibaca saat scrape: name -> fn() -> {label/None: value}
+_GAUGES: dict[str, tuple[str, Callable[[], dict]]] = {}
+
+def gauge(name: str, help: str, fn: Callable[[], dict]) -> None:
+    """Daftarkan gauge; fn mengembalikan {nilai label "key": angka} (label None = tanpa label)."""
+    _GAUGES[name] = (help, fn)
+
+# daftar (stage, detik) milik request yang sedang berjalan, untuk header Server-Timing
+_timings: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("bitify_timings", default=None)
+
+def record(name: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, name)
+    t = _timings.get()
+    if t is not None:
+        t.append((name, seconds))
+
+def observe_size(kind: str, n: int) -> None:
+    SIZE_BYTES.observe(n, kind)
+
+@contextmanager
+def stage(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - t0)
+
+def timed(name: str):
+    """Dekorator: catat durasi fungsi sebagai tahap `name` (histogram + Server-Timing)."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        wrapper.__stage__ = name
+        return wrapper
+    return deco
+
+def render() -> str:
+    out = []
+    for h in _HISTOGRAMS:
+        out += h.render()
+    for name, (help, fn) in sorted(_GAUGES.items()):
+        out += [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+        for label, value in fn().items():
+            if not isinstance(value, (int, float)):
+                continue  # info string (mis. nama backend) bukan sampel
+            out.append(f'{name}{{key="{label}"}} {value}' if label is not None else f"{name} {value}")
+    return "\n".join(out) + "\n"
+
+def _server_timing(timings: list, total: float) -> str:
+    agg: dict[str, float] = {}
+    for name, sec in timings:
+        agg[name] = agg.get(name, 0.0) + sec
+    parts = [f"{name};dur={sec * 1000:.1f}" for name, sec in agg.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+# frame terdalam thread yang sedang menganggur (worker pool kosong, event loop menunggu)
+_IDLE = {"thread.py:_worker", "selectors.py:select", "threading.py:wait"}
+
+class Sampler:
+    """Profiler sampling sederhana: ambil stack semua thread tiap `interval` detik.
+
+    Hasilnya collapsed stack ("a;b;c N") yang bisa langsung dibaca flamegraph.pl /
+    speedscope. Karena semua thread di-sampel, request lain yang jalan bersamaan
+    ikut terlihat; dipakai untuk satu request saat debugging, bukan produksi.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="bitify-sampler", daemon=True)
+
+    def start(self) -> "Sampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> str:
+        self._stop.set()
+        self._thread.join()
+        return "".join(f"{k} {v}\n" for k, v in self.stacks.most_common())
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for t in threading.enumerate():
+                names[t.ident] = t.name
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    co = frame.f_code
+                    stack.append(f"{os.path.basename(co.co_filename)}:{co.co_name}")
+                    frame = frame.f_back
+                if stack and stack[0] in _IDLE:
+                    continue
+                self.stacks[";".join([names.get(tid, str(tid)), *reversed(stack)])] += 1
+
+def _route_label(scope) -> str:
+    """Template path lengkap route yang cocok (mis. /api/jobs/{job_id}), termasuk prefix
+    include_router / mount; template di scope["route"] bisa tanpa prefix itu."""
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if not template:
+        return "unmatched"
+    path = scope.get("path", "")
+    regex = getattr(route, "path_regex", None)
+    if regex is not None:
+        # prefix = bagian depan path asli yang tidak tercakup template route
+        i = 0
+        while i != -1:
+            if regex.match(path[i:]):
+                return path[:i] + template
+            i = path.find("/", i + 1)
+    return scope.get("root_path", "") + template
+
+class TimingMiddleware:
+    """Middleware ASGI: histogram durasi request, header Server-Timing per tahap,
+    dan (kalau profile_dir di-set) profiler sampling untuk request ber-header X-Profile: 1."""
+
+    def __init__(self, app, profile_dir: Optional[str] = None, profile_interval: float = 0.005):
+        self.app = app
+        self.profile_dir = profile_dir
+        self.profile_interval = profile_interval
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        t0 = time.perf_counter()
+        timings: list = []
+        token = _timings.set(timings)
+        status = [500]
+        sampler = profile = None
+        if self.profile_dir and (b"x-profile", b"1") in scope["headers"]:
+            path = scope["path"].strip("/").replace("/", "_") or "root"
+            profile = f"{int(time.time() * 1000)}-{os.getpid()}-{path}.folded"
+            sampler = Sampler(self.profile_interval).start()
+
+        async def send_timed(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", _server_timing(timings, time.perf_counter() - t0).encode()))
+                if sampler is not None:
+                    headers.append((b"x-profile", profile.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            _timings.reset(token)
+            REQUEST_SECONDS.observe(time.perf_counter() - t0, scope["method"], _route_label(scope), str(status[0]))
+            if sampler is not None:
+                self._save_profile(profile, sampler.stop())
+
+    def _save_profile(self, name: str, folded: str) -> None:
+        os.makedirs(self.profile_dir, exist_ok=True)
+        with open(os.path.join(self.profile_dir, name), "w") as f:
+            f.write(folded)
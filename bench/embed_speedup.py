@@ -0,0 +1,68 @@
+# bench/embed_speedup.py
+"""Bandingkan stego_lsb.embed (NumPy) dengan loop per-chunk versi lama.
+
+    python -m bench.embed_speedup [--payload-kb 256] [--repeat 3]
+"""
+import argparse, os, time
+import numpy as np
+from app.algo import stego_lsb
+
+def legacy_embed(pcm: np.ndarray, payload: bytes, key: str, nlsb: int, random_start: bool) -> np.ndarray:
+    """Salinan embed lama (loop Python per sampel), dipakai sebagai referensi."""
+    stream = stego_lsb._pcm_to_stream(pcm).astype(np.int32).copy()
+    total_samples = stream.size
+    if len(payload) > (total_samples * nlsb) // 8:
+        raise ValueError("payload exceeds capacity")
+    bits = np.unpackbits(np.frombuffer(payload, dtype=np.uint8))
+    start = 0
+    if random_start:
+        start = stego_lsb.key_start(key, total_samples)
+    idx = start
+    mask_keep = ~((1 << nlsb) - 1)
+    for i in range(0, len(bits), nlsb):
+        chunk = bits[i:i + nlsb]
+        if chunk.size < nlsb:
+            chunk = np.concatenate([chunk, np.zeros(nlsb - chunk.size, dtype=np.uint8)])
+        value = 0
+        for b in chunk:
+            value = (value << 1) | int(b)
+        stream[idx] = (stream[idx] & mask_keep) | value
+        idx = (idx + 1) % total_samples  # random_start melingkar ke awal stream
+    stego = np.clip(stream, -32768, 32767).astype(np.int16)
+    return stego_lsb._stream_to_pcm(stego, pcm.shape[1])
+
+def _best(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--payload-kb", type=int, default=256)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    payload = os.urandom(args.payload_kb * 1024)
+    # cukup sampel untuk nlsb=1 + sisa ganjil supaya random_start ikut teruji
+    frames = len(payload) * 8 // 2 + 4097
+    pcm = rng.integers(-32768, 32768, size=(frames, 2), dtype=np.int16)
+
+    print(f"payload={args.payload_kb} KB, cover={frames} frames x 2ch")
+    print(f"{'nlsb':>4} {'legacy s':>10} {'numpy s':>10} {'speedup':>8}")
+    for nlsb in range(1, 9):
+        # panjang ganjil -> chunk terakhir ter-pad untuk nlsb yang tidak membagi 8
+        data = payload[:-1]
+        for random_start in (False, True):
+            a = legacy_embed(pcm, data, "bench", nlsb, random_start)
+            b = stego_lsb.embed(pcm, data, "bench", nlsb, random_start)
+            assert a.dtype == b.dtype and np.array_equal(a, b), f"mismatch nlsb={nlsb}"
+        t_old = _best(lambda: legacy_embed(pcm, data, "bench", nlsb, False), args.repeat)
+        t_new = _best(lambda: stego_lsb.embed(pcm, data, "bench", nlsb, False), args.repeat)
+        print(f"{nlsb:>4} {t_old:>10.4f} {t_new:>10.4f} {t_old / t_new:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+# bench/suite.py
+"""Benchmark inti stego + endpoint HTTP, offline, hasil JSON yang bisa dibandingkan antar commit.
+
+    python -m bench.suite [--groups core,io,http] [--sizes 1K,64K,1M,16M,100M]
+                          [--nlsb 1-8] [--repeat 3] [--out bench.json]
+    python -m bench.suite --compare lama.json baru.json
+
+Semua input sintetis (PCM acak ber-seed, payload acak); grup io/http butuh ffmpeg.
+Kombinasi yang butuh cover lebih besar dari --max-cover-mb dilewati dan dicatat.
+"""
+import argparse, json, os, platform, shutil, statistics, subprocess, sys, time
+import numpy as np
+from app.algo import stego_lsb, crypto, pack, metrics, mp3_io, header_probe
+
+SR, CH = 44100, 2
+
+def _parse_size(s: str) -> int:
+    s = s.strip().upper()
+    mult = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}.get(s[-1:], 1)
+    return int(float(s.rstrip("KMG")) * mult)
+
+def _parse_nlsb(s: str) -> list:
+    out = []
+    for part in s.split(","):
+        a, _, b = part.partition("-")
+        out += list(range(int(a), int(b or a) + 1))
+    return out
+
+def _label(n: int) -> str:
+    for u, m in (("M", 1 << 20), ("K", 1 << 10)):
+        if n >= m and n % m == 0:
+            return f"{n // m}{u}"
+    return str(n)
+
+class Runner:
+    def __init__(self, repeat: int, max_cover_bytes: int):
+        self.repeat = repeat
+        self.max_cover_bytes = max_cover_bytes
+        self.results = []
+
+    def time(self, name: str, params: dict, fn, nbytes: int = 0, repeat: int = None):
+        fn()  # warm-up (alokasi pertama, import lazy, cache ffmpeg)
+        runs = []
+        for _ in range(repeat or self.repeat):
+            t0 = time.perf_counter()
+            fn()
+            runs.append(time.perf_counter() - t0)
+        best = min(runs)
+        row = {"name": name, "params": params, "best_s": best, "median_s": statistics.median(runs),
+               "runs": len(runs)}
+        if nbytes:
+            row["mb_s"] = nbytes / best / (1 << 20) if best else None
+        self.results.append(row)
+        extra = f"{row['mb_s']:>10.1f} MB/s" if nbytes else ""
+        print(f"{name:<16} {json.dumps(params, sort_keys=True):<40} {best * 1000:>11.3f} ms {extra}", flush=True)
+        return row
+
+    def skip(self, name: str, params: dict, reason: str):
+        self.results.append({"name": name, "params": params, "skipped": reason})
+        print(f"{name:<16} {json.dumps(params, sort_keys=True):<40} skipped: {reason}", flush=True)
+
+def synthetic_pcm(frames: int, seed: int = 0) -> np.ndarray:
+    """Sinus + noise int16 (frames, CH); deterministik per seed."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(frames, dtype=np.float32) / SR
+    tone = (np.sin(2 * np.pi * 440 * t) * 8000).astype(np.int16)
+    pcm = rng.integers(-2000, 2000, size=(frames, CH), dtype=np.int16)
+    pcm += tone[:, None]
+    return pcm
+
+def bench_core(r: Runner, sizes: list, nlsbs: list):
+    rng = np.random.default_rng(1)
+    for size in sizes:
+        data = rng.integers(0, 256, size, dtype=np.uint8).tobytes()
+        lbl = _label(size)
+        r.time("vig256", {"bytes": lbl, "op": "encrypt"}, lambda: crypto.vig256(data, "bench-key"), size)
+        r.time("vig256", {"bytes": lbl, "op": "decrypt"}, lambda: crypto.vig256(data, "bench-key", True), size)
+        r.time("crc32", {"bytes": lbl}, lambda: pack.crc32_bytes(data), size)
+
+        for nlsb in nlsbs:
+            hdr = pack.build(False, False, nlsb, size=size, name="bench.bin", crc32=0)
+            payload = hdr + data
+            frames = -(-len(payload) * 8 // nlsb // CH) + 1024
+            params = {"bytes": lbl, "nlsb": nlsb}
+            if frames * CH * 2 > r.max_cover_bytes:
+                r.skip("embed", params, f"cover {frames * CH * 2 >> 20} MB > --max-cover-mb")
+                r.skip("extract", params, "see embed")
+                continue
+            pcm = synthetic_pcm(frames)
+            r.time("embed", params, lambda pcm=pcm: stego_lsb.embed(pcm, payload, "bench-key", nlsb, False), len(payload))
+            stego = stego_lsb.embed(pcm, payload, "bench-key", nlsb, False)
+            bits = len(payload) * 8
+            r.time("extract", params, lambda stego=stego: stego_lsb.extract(stego, nlsb, "bench-key", False, bits), len(payload))
+            r.time("probe_header", params, lambda stego=stego: header_probe.probe(stego))
+            if nlsb == nlsbs[0]:
+                start, stop = stego_lsb.span(pcm.size, len(payload), "bench-key", nlsb, False)
+                r.time("psnr", {"bytes": lbl, "region": "full"}, lambda pcm=pcm, stego=stego: metrics.psnr(pcm, stego), pcm.nbytes)
+                r.time("psnr", {"bytes": lbl, "region": "span"},
+                       lambda pcm=pcm, stego=stego: metrics.quality(pcm, stego, start, stop), (stop - start) * 2)
+            del pcm, stego
+
+    for name_len in (8, 255):
+        name = "n" * name_len
+        blob = pack.build(True, False, 3, size=1 << 20, name=name, crc32=0x12345678)
+        params = {"name_len": name_len}
+        r.time("pack.build", params, lambda: [pack.build(True, False, 3, 1 << 20, name, 1) for _ in range(1000)])
+        r.time("pack.parse", params, lambda: [pack.parse(blob) for _ in range(1000)])
+
+def bench_io(r: Runner, seconds: list):
+    for sec in seconds:
+        pcm = synthetic_pcm(int(sec * SR), seed=2)
+        params = {"seconds": sec}
+        wav = mp3_io.encode_wav_from_pcm(pcm, SR, CH)
+        r.time("encode_wav", params, lambda: mp3_io.encode_wav_from_pcm(pcm, SR, CH), pcm.nbytes)
+        r.time("decode_wav", params, lambda: mp3_io.decode_to_pcm(wav), pcm.nbytes)
+        r.time("encode_mp3", params, lambda: mp3_io.encode_from_pcm(pcm, SR, CH, bitrate="320k"), pcm.nbytes)
+        mp3 = mp3_io.encode_from_pcm(pcm, SR, CH, bitrate="320k")
+        r.time("decode_mp3", params, lambda: mp3_io.decode_to_pcm(mp3), pcm.nbytes)
+        r.time("encode_flac", params, lambda: mp3_io.encode_flac_from_pcm(pcm, SR, CH), pcm.nbytes)
+
+def bench_http(r: Runner, sizes: list, seconds: float):
+    # tanpa cache PCM: tiap request mengukur decode sungguhan (env dibaca saat router di-import)
+    os.environ.setdefault("PCM_CACHE_MAX_BYTES", "0")
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    pcm = synthetic_pcm(int(seconds * SR), seed=3)
+    covers = {"wav": mp3_io.encode_wav_from_pcm(pcm, SR, CH), "mp3": mp3_io.encode_from_pcm(pcm, SR, CH, "192k")}
+    rng = np.random.default_rng(4)
+    with TestClient(app) as c:
+        for size in sizes:
+            secret = rng.integers(0, 256, size, dtype=np.uint8).tobytes()
+            for cover_fmt, out_fmt in (("wav", "wav"), ("mp3", "mp3")):
+                params = {"bytes": _label(size), "cover": cover_fmt, "out": out_fmt, "seconds": seconds}
+                form = {"key": "bench-key", "nlsb": "4", "encrypt": "true", "out_format": out_fmt}
+                cap = metrics.capacity_bytes(len(pcm), CH, 4)
+                if size + 300 > cap:
+                    r.skip("http.embed", params, f"payload > capacity {cap}")
+                    continue
+                files = lambda: {"cover": ("c." + cover_fmt, covers[cover_fmt]), "secret": ("s.bin", secret)}
+
+                def embed():
+                    resp = c.post("/api/embed", files=files(), data=form)
+                    resp.raise_for_status()
+                    return resp.json()["stegoAudioUrl"].replace("http://testserver", "")
+
+                r.time("http.embed", params, embed, size)
+                stego = c.get(embed()).content
+
+                def extract():
+                    resp = c.post("/api/extract", files={"stego": ("s." + out_fmt, stego)}, data={"key": "bench-key"})
+                    resp.raise_for_status()
+
+                r.time("http.extract", params, extract, size)
+
+def _meta(args) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "args": {k: v for k, v in vars(args).items() if k != "compare"},
+    }
+
+def _key(row: dict) -> str:
+    return row["name"] + " " + json.dumps(row["params"], sort_keys=True)
+
+def compare(old_path: str, new_path: str) -> None:
+    """Tabel rasio waktu best baru/lama per kasus yang ada di kedua file."""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    before = {_key(x): x for x in old["results"] if "best_s" in x}
+    print(f"{old['meta'].get('commit')} -> {new['meta'].get('commit')}")
+    print(f"{'case':<60} {'old ms':>10} {'new ms':>10} {'ratio':>7}")
+    for row in new["results"]:
+        k = _key(row)
+        if "best_s" not in row or k not in before:
+            continue
+        a, b = before[k]["best_s"], row["best_s"]
+        print(f"{k:<60} {a * 1000:>10.3f} {b * 1000:>10.3f} {b / a if a else float('inf'):>6.2f}x")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--groups", default="core,io,http")
+    ap.add_argument("--sizes", default="1K,64K,1M,16M,100M")
+    ap.add_argument("--nlsb", default="1-8")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--max-cover-mb", type=int, default=512)
+    ap.add_argument("--io-seconds", default="10,60")
+    ap.add_argument("--http-sizes", default="1K,64K,1M")
+    ap.add_argument("--http-seconds", type=float, default=30)
+    ap.add_argument("--out", default="bench.json")
+    ap.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = ap.parse_args()
+    if args.compare:
+        return compare(*args.compare)
+
+    groups = set(args.groups.split(","))
+    r = Runner(args.repeat, args.max_cover_mb << 20)
+    if "core" in groups:
+        bench_core(r, [_parse_size(s) for s in args.sizes.split(",")], _parse_nlsb(args.nlsb))
+    if groups & {"io", "http"} and shutil.which("ffmpeg") is None:
+        print("ffmpeg tidak ditemukan: grup io/http dilewati")
+        groups -= {"io", "http"}
+    if "io" in groups:
+        bench_io(r, [float(s) for s in args.io_seconds.split(",")])
+    if "http" in groups:
+        bench_http(r, [_parse_size(s) for s in args.http_sizes.split(",")], args.http_seconds)
+
+    with open(args.out, "w") as f:
+        json.dump({"meta": _meta(args), "results": r.results}, f, indent=1)
+    print(f"-> {args.out}")
+
+if __name__ == "__main__":
+    main()
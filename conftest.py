@@ -0,0 +1 @@
+# conftest.py: root repo ikut sys.path supaya tests/ bisa `import app...` tanpa instalasi
@@ -0,0 +1,77 @@
+# tests/test_compress.py
+import os
+import pytest
+from app.algo import compress, pack
+
+TEXT = b"Bitify menyisipkan file rahasia ke audio. " * 2000
+
+def _codec_params() -> list:
+    params = []
+    for name in ("zlib", "lzma", "zstd"):
+        codec = compress.CODECS[name]
+        marks = () if compress.available(codec) else (pytest.mark.skip(reason="zstandard not installed"),)
+        params.append(pytest.param(codec, id=name, marks=marks))
+    return params
+
+CODEC_PARAMS = _codec_params()
+
+def _decompress(codec: int, blob: bytes, limit: int, chunk: int = 4096) -> bytes:
+    d = compress.Decompressor(codec, limit)
+    parts = [d.update(blob[i:i + chunk]) for i in range(0, len(blob), chunk)]
+    parts.append(d.finish())
+    return b"".join(parts)
+
+@pytest.mark.parametrize("codec", CODEC_PARAMS)
+def test_roundtrip_in_chunks(codec):
+    blob, used = compress.compress(TEXT, codec, compress.level_for(codec))
+    assert used == codec and len(blob) < len(TEXT)
+    assert _decompress(codec, blob, len(TEXT)) == TEXT
+
+@pytest.mark.parametrize("codec", CODEC_PARAMS)
+def test_output_beyond_declared_size_is_rejected(codec):
+    bomb = bytes(8 << 20)
+    blob, _ = compress.compress(bomb, codec, compress.level_for(codec))
+    d = compress.Decompressor(codec, 1000)
+    produced = 0
+    with pytest.raises(ValueError, match="larger than header size"):
+        for i in range(0, len(blob), 4096):
+            produced += len(d.update(blob[i:i + 4096]))
+        d.finish()
+    # berhenti di potongan pertama yang melewati batas, tidak men-dekompres semuanya
+    assert produced <= 1000
+
+@pytest.mark.parametrize("codec", [compress.ZLIB, compress.LZMA])
+def test_truncated_stream_is_rejected(codec):
+    blob, _ = compress.compress(TEXT, codec, compress.level_for(codec))
+    with pytest.raises(ValueError, match="truncated"):
+        _decompress(codec, blob[:len(blob) // 2], len(TEXT))
+
+def test_incompressible_input_falls_back_to_raw():
+    noise = os.urandom(200 << 10)
+    assert not compress.worth_it(noise)
+    assert compress.worth_it(TEXT)
+    assert not compress.worth_it(b"")
+    data, used = compress.compress(noise, compress.ZLIB, 9)
+    assert (data, used) == (noise, compress.NONE)
+    assert compress.compress(b"", compress.ZLIB, 6) == (b"", compress.NONE)
+
+def test_level_validation():
+    assert compress.level_for(compress.ZLIB) == 6
+    assert compress.level_for(compress.NONE, 99) == 0
+    with pytest.raises(ValueError):
+        compress.level_for(compress.LZMA, 10)
+    with pytest.raises(ValueError):
+        compress.Decompressor(7, 10)
+
+@pytest.mark.parametrize("codec", [compress.NONE, *CODEC_PARAMS])
+@pytest.mark.parametrize("nlsb", [1, 8])
+def test_codec_survives_pack_parse(codec, nlsb):
+    stored, used = compress.compress(TEXT, codec, compress.level_for(codec))
+    raw = pack.build(True, True, nlsb, size=len(stored), name="a.txt", crc32=pack.crc32_bytes(TEXT),
+                     key="k", block_crcs=pack.block_crcs(stored), codec=used, raw_size=len(TEXT))
+    hdr, consumed = pack.parse(raw)
+    assert (hdr.codec, hdr.nlsb, hdr.encrypt, hdr.random_start) == (used, nlsb, True, True)
+    assert hdr.raw_size == (len(TEXT) if used else 0)
+    assert consumed == len(raw)
+    if used:
+        assert _decompress(hdr.codec, stored, hdr.raw_size) == TEXT
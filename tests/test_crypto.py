@@ -0,0 +1,32 @@
+# tests/test_crypto.py
+import os
+import pytest
+from app.algo import crypto
+
+def reference_vig256(data: bytes, key: str, decrypt: bool = False) -> bytes:
+    kb = key.encode("utf-8")
+    sign = -1 if decrypt else 1
+    return bytes((b + sign * kb[i % len(kb)]) % 256 for i, b in enumerate(data))
+
+@pytest.mark.parametrize("key", ["k", "abc123", "kunci-rahasia-25-karakter", "ünï"])
+def test_vig256_matches_reference(key):
+    data = os.urandom(1000)
+    enc = crypto.vig256(data, key)
+    assert enc == reference_vig256(data, key)
+    assert crypto.vig256(enc, key, decrypt=True) == data
+
+@pytest.mark.parametrize("sizes", [[1, 1, 1], [3, 7, 11, 0, 5], [64, 1000, 3], [999]])
+def test_streaming_cipher_matches_one_shot(sizes):
+    data = os.urandom(sum(sizes))
+    for decrypt in (False, True):
+        c = crypto.Vig256("abcdefg", decrypt=decrypt)
+        parts, pos = [], 0
+        for n in sizes:
+            parts.append(c.update(data[pos:pos + n]))
+            pos += n
+        assert b"".join(parts) == crypto.vig256(data, "abcdefg", decrypt=decrypt)
+
+def test_empty_input_and_key():
+    assert crypto.vig256(b"", "abc") == b""
+    with pytest.raises(ValueError):
+        crypto.vig256(b"x", "")
@@ -0,0 +1,62 @@
+# tests/test_header_probe.py
+import os, struct
+import numpy as np
+import pytest
+from app.algo import header_probe, pack, stego_lsb
+
+KEY = "kunci"
+
+def v1_header(nlsb: int, size: int, name: str) -> bytes:
+    flags = 1 | ((nlsb - 1) << 2)
+    name_b = name.encode()
+    return pack.MAGIC + bytes([1, flags]) + struct.pack("<Q", size) + bytes([len(name_b)]) + name_b + bytes(4)
+
+def headers(nlsb: int, data: bytes):
+    """(label, header) untuk v1 (nlsb <= 4), v2, v3, dan v3 terkompresi dengan nama 255 byte."""
+    if nlsb <= 4:
+        yield "v1", v1_header(nlsb, len(data), "a.txt")
+    yield "v2", pack.build(True, False, nlsb, size=len(data), name="a.txt", crc32=0)
+    crcs = pack.block_crcs(data, 8)
+    yield "v3", pack.build(True, False, nlsb, size=len(data), name="a.txt", crc32=0, key=KEY,
+                           block_crcs=crcs, block_log2=8)
+    yield "v3-max", pack.build(True, False, nlsb, size=len(data), name="n" * 300, crc32=0, key=KEY,
+                               block_crcs=crcs, block_log2=8, codec=1, raw_size=1 << 40)
+
+def _cover(seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).integers(-32768, 32768, size=(6000, 2), dtype=np.int16)
+
+@pytest.mark.parametrize("nlsb", range(1, 9))
+@pytest.mark.parametrize("random_start", [False, True])
+def test_probe_finds_every_header_version(nlsb, random_start):
+    data = os.urandom(700)
+    pcm = _cover(nlsb)
+    for label, hdr in headers(nlsb, data):
+        stego = stego_lsb.embed(pcm, hdr + data, KEY, nlsb, random_start)
+        start = stego_lsb.key_start(KEY, pcm.size) if random_start else 0
+        assert nlsb in header_probe.candidates(stego, start), label
+        found = header_probe.probe(stego, start)
+        assert found is not None, label
+        parsed, consumed, got_nlsb = found
+        assert got_nlsb == nlsb and parsed.size == len(data), label
+        assert consumed == len(hdr), label
+        payload = stego_lsb.extract(stego, nlsb, KEY, random_start, (consumed + parsed.size) * 8)
+        assert payload[consumed:] == data, label
+
+def test_longest_header_fits_probe_budget():
+    data = os.urandom(10)
+    hdr = list(headers(8, data))[-1][1]
+    prefix = pack.parse_prefix(hdr)[1]
+    assert prefix == header_probe.HEADER_MAX_BYTES
+
+def test_probe_rejects_cover_without_header():
+    pcm = _cover(99)
+    assert header_probe.probe(pcm) is None
+    assert header_probe.probe(pcm, stego_lsb.key_start(KEY, pcm.size)) is None
+
+def test_probe_needs_the_right_offset():
+    pcm = _cover(5)
+    data = os.urandom(100)
+    hdr = pack.build(False, True, 3, size=len(data), name="x", crc32=0)
+    stego = stego_lsb.embed(pcm, hdr + data, KEY, 3, True)
+    assert header_probe.probe(stego, stego_lsb.key_start(KEY, pcm.size))[2] == 3
+    assert header_probe.probe(stego, 0) is None
@@ -0,0 +1,69 @@
+# tests/test_id3_tags.py
+import io, struct
+import pytest
+from mutagen.id3 import ID3
+from app.algo import id3_tags
+
+AUDIO = b"\xff\xfb\x90\x00" + bytes(413) + b"\xff\xfb\x90\x00" + bytes(413)
+
+def synchsafe(n: int) -> bytes:
+    return bytes(((n >> 21) & 0x7F, (n >> 14) & 0x7F, (n >> 7) & 0x7F, n & 0x7F))
+
+def id3_frame(major: int, fid: bytes, body: bytes) -> bytes:
+    size = synchsafe(len(body)) if major == 4 else struct.pack(">I", len(body))
+    return fid + size + b"\0\0" + body
+
+def id3_tag(major: int, frames: list, padding: int = 0) -> bytes:
+    body = b"".join(frames) + bytes(padding)
+    return b"ID3" + bytes((major, 0, 0)) + synchsafe(len(body)) + body
+
+def priv(major: int, owner: str, data: bytes) -> bytes:
+    return id3_frame(major, b"PRIV", owner.encode("latin-1") + b"\0" + data)
+
+def title(major: int, text: str) -> bytes:
+    return id3_frame(major, b"TIT2", b"\x03" + text.encode())
+
+# ukuran frame > 127 byte: synchsafe (v2.4) dan integer biasa (v2.3) berbeda
+BIG = bytes(range(256)) * 3
+
+@pytest.mark.parametrize("major", [3, 4])
+def test_roundtrip_preserves_other_frames(major):
+    tag = id3_tag(major, [title(major, "Judul"), priv(major, "other", BIG), priv(major, id3_tags.OWNER, b"old")],
+                  padding=64)
+    out = id3_tags.write_priv(tag + AUDIO, BIG + b"new")
+    assert id3_tags.read_priv(out) == BIG + b"new"
+    assert id3_tags.read_priv(out, owner="other") == BIG
+    assert out.endswith(AUDIO)
+    # tag hasil harus bisa dibaca parser lain: frame lama tetap ada, PRIV bitify hanya satu
+    id3 = ID3(io.BytesIO(out))
+    assert id3.version[1] == major
+    assert str(id3["TIT2"]) == "Judul"
+    owners = sorted(f.owner for f in id3.getall("PRIV"))
+    assert owners == sorted(["other", id3_tags.OWNER])
+
+@pytest.mark.parametrize("major", [3, 4])
+def test_rewrite_replaces_own_priv(major):
+    out = id3_tags.write_priv(id3_tag(major, [title(major, "x")]) + AUDIO, b"first")
+    out = id3_tags.write_priv(out, b"second" * 100)
+    assert id3_tags.read_priv(out) == b"second" * 100
+    assert len(ID3(io.BytesIO(out)).getall("PRIV")) == 1
+    assert out.endswith(AUDIO)
+
+def test_file_without_tag():
+    assert id3_tags.read_priv(AUDIO) is None
+    out = id3_tags.write_priv(AUDIO, BIG)
+    assert out.startswith(b"ID3\x03") and out.endswith(AUDIO)
+    assert id3_tags.read_priv(out) == BIG
+    assert len(out) == len(AUDIO) + 10 + 10 + len(id3_tags.OWNER) + 1 + len(BIG)
+
+def test_read_priv_ignores_other_owners():
+    tag = id3_tag(3, [priv(3, "bitifyx", b"a"), priv(3, "other", b"b")])
+    assert id3_tags.read_priv(tag + AUDIO) is None
+
+@pytest.mark.parametrize("major", [3, 4])
+def test_write_priv_file_matches_in_memory(tmp_path, major):
+    src = tmp_path / "in.mp3"
+    src.write_bytes(id3_tag(major, [title(major, "Judul"), priv(major, "other", b"keep")], padding=20) + AUDIO)
+    dst = tmp_path / "out.mp3"
+    id3_tags.write_priv_file(str(src), str(dst), BIG)
+    assert dst.read_bytes() == id3_tags.write_priv(src.read_bytes(), BIG)
@@ -0,0 +1,26 @@
+# tests/test_jobs.py
+import asyncio, threading
+from app.utils import jobs
+from app.utils.pool import run_io
+
+def test_on_change_runs_off_loop_in_order():
+    seen, threads = [], set()
+
+    def write(view):
+        threads.add(threading.get_ident())
+        seen.append((view["jobId"], view["status"]))
+
+    async def main():
+        q = jobs.JobQueue(workers=1, on_change=lambda view: run_io(write, view))
+        q.start()
+        done = q.submit("embed", lambda: asyncio.sleep(0, {"ok": True}))
+        hung = q.submit("embed", lambda: asyncio.Event().wait())  # tidak pernah selesai
+        while done.status != jobs.DONE:
+            await asyncio.sleep(0.01)
+        await q.stop()  # flush status akhir sebelum kembali
+        return done, hung, threading.get_ident()
+
+    done, hung, loop_thread = asyncio.run(main())
+    assert [s for j, s in seen if j == done.id] == ["queued", "running", "done"]
+    assert [s for j, s in seen if j == hung.id][-1] == "cancelled"
+    assert loop_thread not in threads
@@ -0,0 +1,64 @@
+# tests/test_metrics.py
+import math, os
+import numpy as np
+import pytest
+from app.algo import metrics, stego_lsb
+
+def reference_quality(orig: np.ndarray, stego: np.ndarray, start: int, stop: int, seg_frames: int) -> dict:
+    """PSNR atas seluruh sinyal (float64) + segmental SNR atas segmen yang menyentuh [start, stop)."""
+    o = orig.reshape(-1).astype(np.float64)
+    s = stego.reshape(-1).astype(np.float64)
+    total, ch = o.size, orig.shape[1]
+    d = (s - o) ** 2
+    psnr = lambda mse: 100.0 if mse == 0 else 20 * math.log10(metrics.MAX_I) - 10 * math.log10(mse)
+    touched = set(range(start, min(stop, total))) | set(range(0, max(0, stop - total)))
+    seg = seg_frames * ch
+    dbs = []
+    for k in sorted({i // seg for i in touched}):
+        noise = d[k * seg:(k + 1) * seg].sum()
+        signal = (o[k * seg:(k + 1) * seg] ** 2).sum()
+        db = 35.0 if noise == 0 else (-10.0 if signal == 0 else 10 * math.log10(signal / noise))
+        dbs.append(min(35.0, max(-10.0, db)))
+    return {
+        "psnr": psnr(d.sum() / total),
+        "channels": [psnr(d[c::ch].sum() / (total // ch)) for c in range(ch)],
+        "segSnr": float(np.mean(dbs)) if dbs else 35.0,
+    }
+
+@pytest.mark.parametrize("ch", [1, 2])
+@pytest.mark.parametrize("nlsb", [1, 4, 8])
+@pytest.mark.parametrize("random_start", [False, True])
+def test_region_quality_matches_full_signal(ch, nlsb, random_start):
+    rng = np.random.default_rng(nlsb)
+    orig = rng.integers(-20000, 20000, size=(5003, ch), dtype=np.int16)
+    payload = os.urandom(300)
+    # key dengan offset dekat ujung stream supaya rentang random_start melingkar
+    key = next(f"k{i}" for i in range(10000)
+               if stego_lsb.key_start(f"k{i}", orig.size) > orig.size - 500)
+    stego = stego_lsb.embed(orig, payload, key, nlsb, random_start)
+    start, stop = stego_lsb.span(orig.size, len(payload), key, nlsb, random_start)
+    got = metrics.quality(orig, stego, start, stop, seg_frames=64)
+    ref = reference_quality(orig, stego, start, stop, seg_frames=64)
+    assert got["psnr"] == pytest.approx(ref["psnr"], rel=1e-9)
+    assert [c["psnr"] for c in got["channels"]] == pytest.approx(ref["channels"], rel=1e-9)
+    assert got["segSnr"] == pytest.approx(ref["segSnr"], rel=1e-9)
+    assert got["modifiedSamples"] == stop - start
+
+def test_identical_signal_is_lossless():
+    orig = np.random.default_rng(0).integers(-100, 100, size=(1000, 2), dtype=np.int16)
+    res = metrics.quality(orig, orig.copy(), 10, 200)
+    assert res["psnr"] == 100.0 and res["mse"] == 0.0
+
+def test_accumulator_chunks_match_single_pass():
+    rng = np.random.default_rng(1)
+    orig = rng.integers(-20000, 20000, size=(4096, 2), dtype=np.int16)
+    stego = stego_lsb.embed(orig, os.urandom(1500), "abc", 3, False)
+    start, stop = stego_lsb.span(orig.size, 1500, "abc", 3, False)
+    acc = metrics.QualityAccumulator(orig.size, 2, start, stop, seg_frames=64)
+    o, s = orig.reshape(-1), stego.reshape(-1)
+    for i in range(0, o.size, 64 * 2 * 5):
+        acc.add(o[i:i + 640], s[i:i + 640], i)
+    got, ref = acc.result(), metrics.quality(orig, stego, start, stop, seg_frames=64)
+    assert got["psnr"] == pytest.approx(ref["psnr"])
+    assert got["segSnr"] == pytest.approx(ref["segSnr"])
+    assert [c["mse"] for c in got["channels"]] == pytest.approx([c["mse"] for c in ref["channels"]])
@@ -0,0 +1,113 @@
+# tests/test_mp3_frames.py
+import struct
+import pytest
+from app.algo import mp3_frames
+
+# versi: 3 = MPEG1, 2 = MPEG2, 0 = MPEG2.5 ; layer: 1 = Layer III
+def frame_header(version: int = 3, layer: int = 1, br_idx: int = 9, sr_idx: int = 0,
+                 mono: bool = False, padding: int = 0) -> bytes:
+    h = (0x7FF << 21) | (version << 19) | (layer << 17) | (1 << 16) | (br_idx << 12) | (sr_idx << 10) \
+        | (padding << 9) | ((3 if mono else 0) << 6)
+    return struct.pack(">I", h)
+
+def frame(**kw) -> bytes:
+    hdr = frame_header(**kw)
+    fh = mp3_frames._parse_header(hdr, 0)
+    return hdr + bytes(fh.length - 4)
+
+def info_frame(frames: int, start_pad: int = None, end_pad: int = None, tag: bytes = b"Info", **kw) -> bytes:
+    """Frame Xing/Info dengan jumlah frame dan (opsional) tag LAME berisi padding gapless."""
+    buf = bytearray(frame(**kw))
+    off = mp3_frames.xing_offset(mp3_frames._parse_header(buf, 0))
+    buf[off:off + 12] = tag + struct.pack(">II", 1, frames)
+    if start_pad is not None:
+        q = off + 12
+        buf[q:q + 4] = b"LAME"
+        buf[q + 21:q + 24] = ((start_pad << 12) | end_pad).to_bytes(3, "big")
+    return bytes(buf)
+
+@pytest.mark.parametrize("end_pad", [0, 300, 528, 529, 530, 1500])
+def test_scan_and_index_agree_on_gapless_trim(end_pad):
+    n = 100
+    data = info_frame(n, start_pad=576, end_pad=end_pad) + frame() * n
+    info = mp3_frames.scan(data)
+    ix = mp3_frames.index(data)
+    raw = n * 1152
+    skip = 576 + mp3_frames.DECODER_DELAY
+    # ffmpeg: ujung digeser DECODER_DELAY dan dijepit ke panjang raw
+    expected = min(raw, raw - end_pad + mp3_frames.DECODER_DELAY) - skip
+    assert info.source == "xing"
+    assert info.samples == ix.samples == expected
+    assert ix.skip == skip
+
+def id3v2(body: bytes = b"\0" * 30) -> bytes:
+    size = len(body)
+    syncsafe = bytes([(size >> 21) & 0x7F, (size >> 14) & 0x7F, (size >> 7) & 0x7F, size & 0x7F])
+    return b"ID3\x04\x00\x00" + syncsafe + body
+
+@pytest.mark.parametrize("version, sr, spf", [(3, 44100, 1152), (2, 22050, 576), (0, 11025, 576)])
+@pytest.mark.parametrize("mono", [False, True])
+def test_scan_counts_frames_without_vbr_tag(version, sr, spf, mono):
+    data = frame(version=version, mono=mono) * 7 + frame(version=version, mono=mono, padding=1) * 3
+    info = mp3_frames.scan(data)
+    assert (info.source, info.sample_rate, info.channels) == ("scan", sr, 1 if mono else 2)
+    assert (info.frames, info.samples) == (10, 10 * spf)
+    plain, padded = len(frame(version=version, mono=mono)), len(frame(version=version, mono=mono, padding=1))
+    expected = [i * plain for i in range(8)] + [7 * plain + padded, 7 * plain + 2 * padded]
+    assert [off for off, _ in mp3_frames.iter_frames(data)] == expected
+
+def test_frame_lengths_per_version_and_layer():
+    # MPEG1 L3 128k 44.1k: 144 * 128000 / 44100 = 417 (+1 padding)
+    assert mp3_frames._parse_header(frame_header(), 0).length == 417
+    assert mp3_frames._parse_header(frame_header(padding=1), 0).length == 418
+    # MPEG2 L3 80k 22.05k: 72 * 80000 / 22050 = 261 ; MPEG2.5 80k 11.025k = 522
+    assert mp3_frames._parse_header(frame_header(version=2), 0).length == 261
+    assert mp3_frames._parse_header(frame_header(version=0), 0).length == 522
+    # MPEG1 Layer I 288k: (12 * 288000 // 44100) * 4 = 312, 384 sampel
+    fh = mp3_frames._parse_header(frame_header(layer=3), 0)
+    assert (fh.length, fh.samples) == (312, 384)
+    # versi reserved / bitrate bebas / sample rate reserved -> tidak bisa dihitung
+    for bad in (frame_header(version=1), frame_header(br_idx=0), frame_header(br_idx=15), frame_header(sr_idx=3)):
+        assert mp3_frames._parse_header(bad, 0) is None
+
+def test_scan_skips_leading_id3v2_and_trailing_tags():
+    data = id3v2() + id3v2(b"\0" * 5) + frame() * 4 + b"TAG" + bytes(125)
+    info = mp3_frames.scan(data)
+    assert (info.frames, info.samples) == (4, 4 * 1152)
+    assert mp3_frames.index(data).offsets[0] == len(id3v2()) + len(id3v2(b"\0" * 5))
+
+def test_scan_rejects_lost_sync_and_mixed_streams():
+    f = frame()
+    assert mp3_frames.scan(f * 3 + b"\x12" * len(f) + f * 3) is None
+    assert mp3_frames.scan(f * 3 + frame(mono=True) * 3) is None
+    assert mp3_frames.scan(f) is None  # satu header saja belum cukup
+    assert mp3_frames.scan(b"RIFF" + bytes(2000)) is None
+    assert mp3_frames.index(f * 3 + b"\x12" * len(f) + f * 3) is None
+
+@pytest.mark.parametrize("tag", [b"Xing", b"Info"])
+def test_xing_without_lame_tag_uses_frame_count(tag):
+    data = info_frame(50, tag=tag) + frame() * 50
+    info = mp3_frames.scan(data)
+    assert (info.source, info.frames, info.samples) == ("xing", 50, 50 * 1152)
+    ix = mp3_frames.index(data)
+    assert (ix.frames, ix.skip, ix.samples) == (50, 0, 50 * 1152)
+    assert ix.offsets[0] == len(frame())  # frame Info bukan audio
+
+def test_xing_on_mpeg2_mono_uses_short_side_info():
+    data = info_frame(20, start_pad=576, end_pad=1000, version=2, mono=True) + frame(version=2, mono=True) * 20
+    info = mp3_frames.scan(data)
+    assert (info.source, info.channels, info.sample_rate) == ("xing", 1, 22050)
+    assert info.samples == mp3_frames.index(data).samples == 20 * 576 - 576 - 1000
+
+def test_index_rejects_frame_count_mismatch():
+    data = info_frame(49, start_pad=576, end_pad=1000) + frame() * 50
+    assert mp3_frames.index(data) is None
+
+def test_vbri_header():
+    buf = bytearray(frame())
+    buf[36:40] = b"VBRI"
+    buf[36 + 14:36 + 18] = struct.pack(">I", 30)
+    data = bytes(buf) + frame() * 30
+    info = mp3_frames.scan(data)
+    assert (info.source, info.frames, info.samples) == ("vbri", 30, 30 * 1152)
+    assert mp3_frames.index(data) is None  # ffmpeg tidak memakai trim VBRI: potong lewat jalur serial
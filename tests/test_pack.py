@@ -0,0 +1,74 @@
+# tests/test_pack.py
+import os, struct, zlib
+import pytest
+from app.algo import pack
+
+def _v1(encrypt: bool, random_start: bool, nlsb: int, size: int, name: str, crc32: int) -> bytes:
+    """Header v1: nlsb hanya 2 bit di flags (1..4)."""
+    flags = int(encrypt) | (int(random_start) << 1) | ((nlsb - 1) << 2)
+    name_b = name.encode()
+    return pack.MAGIC + bytes([1, flags]) + struct.pack("<Q", size) + bytes([len(name_b)]) + name_b + \
+        struct.pack("<I", crc32)
+
+@pytest.mark.parametrize("nlsb", [1, 2, 3, 4])
+def test_parse_v1(nlsb):
+    raw = _v1(True, False, nlsb, 1234, "a.txt", 0xDEADBEEF)
+    hdr, consumed = pack.parse(raw + b"payload")
+    assert (hdr.version, hdr.encrypt, hdr.random_start, hdr.nlsb) == (1, True, False, nlsb)
+    assert (hdr.size, hdr.name, hdr.crc32, consumed) == (1234, "a.txt", 0xDEADBEEF, len(raw))
+    assert pack.check_key(hdr, "any key")
+
+@pytest.mark.parametrize("nlsb", range(1, 9))
+def test_build_parse_v2(nlsb):
+    raw = pack.build(False, True, nlsb, size=99, name="rahasia.bin", crc32=7)
+    hdr, consumed = pack.parse(raw)
+    assert (hdr.version, hdr.encrypt, hdr.random_start, hdr.nlsb) == (2, False, True, nlsb)
+    assert (hdr.size, hdr.name, hdr.crc32, consumed) == (99, "rahasia.bin", 7, len(raw))
+    assert hdr.block_crcs == [] and hdr.codec == 0
+
+@pytest.mark.parametrize("codec", [0, 1])
+def test_build_parse_v3(codec):
+    data = os.urandom(3 * 256 + 17)
+    crcs = pack.block_crcs(data, block_log2=8)
+    raw = pack.build(True, False, 5, size=len(data), name="f.jpg", crc32=pack.crc32_bytes(data),
+                     key="abc", block_crcs=crcs, block_log2=8, codec=codec, raw_size=5000 if codec else 0)
+    hdr, consumed = pack.parse(raw + data)
+    assert (hdr.version, hdr.nlsb, hdr.size, hdr.name) == (3, 5, len(data), "f.jpg")
+    assert (hdr.block_size, hdr.n_blocks, hdr.block_crcs) == (256, 4, crcs)
+    assert (hdr.codec, hdr.raw_size) == ((codec, 5000) if codec else (0, 0))
+    assert consumed == len(raw)
+    assert pack.parse_prefix(raw)[2] == 4 * 4
+    assert pack.check_key(hdr, "abc") and not pack.check_key(hdr, "abd")
+
+def test_v3_unencrypted_header_has_no_key_tag():
+    raw = pack.build(False, False, 1, size=0, name="", crc32=0, key="abc", block_crcs=[])
+    hdr, _ = pack.parse(raw)
+    assert hdr.key_tag == bytes(8)
+
+def test_verified_blocks_stops_at_first_bad_block():
+    data = bytearray(os.urandom(1000))
+    raw = pack.build(False, False, 1, size=len(data), name="x", crc32=zlib.crc32(data),
+                     block_crcs=pack.block_crcs(bytes(data), 8), block_log2=8)
+    hdr, _ = pack.parse(raw)
+    chunks = [bytes(data[i:i + 256]) for i in range(0, len(data), 256)]
+    assert b"".join(pack.verified_blocks(hdr, chunks)) == bytes(data)
+    chunks[2] = b"\0" + chunks[2][1:]
+    it = pack.verified_blocks(hdr, chunks)
+    assert next(it) == chunks[0] and next(it) == chunks[1]
+    with pytest.raises(ValueError, match="block 2"):
+        next(it)
+
+def test_parse_rejects_bad_input():
+    with pytest.raises(AssertionError):
+        pack.parse(b"NOPE" + bytes(20))
+    raw = pack.build(True, False, 1, size=300, name="x", crc32=0, key="k",
+                     block_crcs=[0, 0], block_log2=8)
+    with pytest.raises(ValueError, match="truncated"):
+        pack.parse(raw[:-1])
+    with pytest.raises(ValueError, match="unsupported"):
+        pack.parse(pack.MAGIC + bytes([9]) + bytes(20))
+
+def test_check_key_accepts_any_key_for_unencrypted_v3():
+    raw = pack.build(False, True, 2, size=10, name="x", crc32=0, key="abc", block_crcs=[0])
+    hdr, _ = pack.parse(raw)
+    assert pack.check_key(hdr, "abc") and pack.check_key(hdr, "other") and pack.check_key(hdr, "")
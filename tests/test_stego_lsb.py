@@ -0,0 +1,107 @@
+# tests/test_stego_lsb.py
+import os
+import numpy as np
+import pytest
+from app.algo import stego_lsb
+
+def reference_embed(pcm: np.ndarray, payload: bytes, key: str, nlsb: int, random_start: bool) -> np.ndarray:
+    """Loop per sampel seperti embed versi lama: nilai nlsb-bit MSB dulu, chunk terakhir di-pad nol."""
+    stream = pcm.reshape(-1).astype(np.int32)
+    total = stream.size
+    bits = np.unpackbits(np.frombuffer(payload, dtype=np.uint8))
+    idx = stego_lsb.key_start(key, total) if random_start else 0
+    for i in range(0, bits.size, nlsb):
+        chunk = list(bits[i:i + nlsb]) + [0] * (nlsb - bits[i:i + nlsb].size)
+        value = 0
+        for b in chunk:
+            value = (value << 1) | int(b)
+        stream[idx] = (stream[idx] & ~((1 << nlsb) - 1)) | value
+        idx = (idx + 1) % total
+    return stream.astype(np.int16).reshape(pcm.shape)
+
+def _cover(frames: int, ch: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return rng.integers(-32768, 32768, size=(frames, ch), dtype=np.int16)
+
+def _wrapping_key(total: int, n: int) -> str:
+    """Key yang offset random_start-nya membuat n sampel melewati ujung stream."""
+    for i in range(10000):
+        key = f"k{i}"
+        if stego_lsb.key_start(key, total) + n > total:
+            return key
+    raise AssertionError("no wrapping key found")
+
+@pytest.mark.parametrize("nlsb", range(1, 9))
+@pytest.mark.parametrize("ch", [1, 2])
+@pytest.mark.parametrize("random_start", [False, True])
+def test_embed_matches_reference(nlsb, ch, random_start):
+    pcm = _cover(1701, ch)
+    # 203 byte: 1624 bit, tidak habis dibagi nlsb 3/5/6/7 -> chunk terakhir ter-pad
+    payload = os.urandom(203)
+    out = stego_lsb.embed(pcm, payload, "abc", nlsb, random_start)
+    assert out.dtype == np.int16 and out.shape == pcm.shape
+    assert np.array_equal(out, reference_embed(pcm, payload, "abc", nlsb, random_start))
+
+@pytest.mark.parametrize("nlsb", [1, 3, 8])
+def test_embed_wraps_around(nlsb):
+    pcm = _cover(2000, 2)
+    payload = os.urandom(2000 * 2 * nlsb // 8 // 2)
+    n = -(-len(payload) * 8 // nlsb)
+    key = _wrapping_key(pcm.size, n)
+    out = stego_lsb.embed(pcm, payload, key, nlsb, True)
+    assert np.array_equal(out, reference_embed(pcm, payload, key, nlsb, True))
+
+def test_embed_does_not_touch_cover():
+    pcm = _cover(500, 2)
+    before = pcm.copy()
+    stego_lsb.embed(pcm, os.urandom(100), "abc", 4, True)
+    assert np.array_equal(pcm, before)
+
+def test_embed_rejects_oversized_payload():
+    pcm = _cover(100, 1)
+    with pytest.raises(ValueError):
+        stego_lsb.embed(pcm, bytes(101), "abc", 8, False)
+
+def reference_extract(pcm: np.ndarray, nlsb: int, start: int, total_bits: int) -> bytes:
+    """Baca nlsb bit terbawah per sampel (MSB dulu) mulai `start`, melingkar ke awal stream."""
+    stream = pcm.reshape(-1)
+    bits = []
+    idx = start
+    while len(bits) < total_bits:
+        v = int(stream[idx]) & ((1 << nlsb) - 1)
+        bits += [(v >> (nlsb - 1 - j)) & 1 for j in range(nlsb)]
+        idx = (idx + 1) % stream.size
+    return np.packbits(np.array(bits[:total_bits], dtype=np.uint8)).tobytes()
+
+@pytest.mark.parametrize("nlsb", range(1, 9))
+@pytest.mark.parametrize("ch", [1, 2])
+@pytest.mark.parametrize("random_start", [False, True])
+def test_extract_roundtrip(nlsb, ch, random_start):
+    pcm = _cover(1701, ch, seed=1)
+    payload = os.urandom(203)
+    stego = stego_lsb.embed(pcm, payload, "abc", nlsb, random_start)
+    got = stego_lsb.extract(stego, nlsb, "abc", random_start, len(payload) * 8)
+    assert got == payload
+    start = stego_lsb.key_start("abc", pcm.size) if random_start else 0
+    assert got == reference_extract(stego, nlsb, start, len(payload) * 8)
+
+@pytest.mark.parametrize("nlsb", [1, 5, 8])
+def test_extract_wraps_around(nlsb):
+    pcm = _cover(2000, 2, seed=2)
+    payload = os.urandom(2000 * 2 * nlsb // 8 // 2)
+    key = _wrapping_key(pcm.size, -(-len(payload) * 8 // nlsb))
+    stego = stego_lsb.embed(pcm, payload, key, nlsb, True)
+    assert stego_lsb.extract(stego, nlsb, key, True, len(payload) * 8) == payload
+
+@pytest.mark.parametrize("total_bits", [1, 7, 13, 801])
+def test_extract_partial_bits_and_start_hint(total_bits):
+    pcm = _cover(1000, 2, seed=3)
+    for nlsb in (3, 8):
+        got = stego_lsb.extract(pcm, nlsb, "", False, total_bits, start_hint=17)
+        assert got == reference_extract(pcm, nlsb, 17, total_bits)
+
+def test_extract_does_not_modify_input():
+    pcm = _cover(500, 2, seed=4)
+    before = pcm.copy()
+    stego_lsb.extract(pcm, 8, "abc", True, 800)
+    assert np.array_equal(pcm, before)
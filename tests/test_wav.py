@@ -0,0 +1,66 @@
+# tests/test_wav.py
+import struct
+import numpy as np
+import pytest
+from app.algo import mp3_io
+
+PCM = np.arange(-300, 300, dtype=np.int16).reshape(-1, 2)
+
+def chunk(cid: bytes, body: bytes) -> bytes:
+    return cid + struct.pack("<I", len(body)) + body + (b"\0" if len(body) & 1 else b"")
+
+def fmt_pcm(ch: int = 2, sr: int = 44100, bits: int = 16, tag: int = 1) -> bytes:
+    align = ch * bits // 8
+    return chunk(b"fmt ", struct.pack("<HHIIHH", tag, ch, sr, sr * align, align, bits))
+
+def fmt_extensible(ch: int = 2, sr: int = 48000, bits: int = 16, sub: int = 1) -> bytes:
+    align = ch * bits // 8
+    base = struct.pack("<HHIIHH", 0xFFFE, ch, sr, sr * align, align, bits)
+    ext = struct.pack("<HHI", 22, bits, 3) + struct.pack("<H", sub) + bytes(14)  # GUID subformat
+    return chunk(b"fmt ", base + ext)
+
+def riff(*chunks: bytes) -> bytes:
+    body = b"WAVE" + b"".join(chunks)
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+def test_plain_pcm_matches_encoder():
+    wav = mp3_io.encode_wav_from_pcm(PCM, 44100, 2)
+    pcm, sr, ch = mp3_io.parse_wav(wav)
+    assert (sr, ch) == (44100, 2) and np.array_equal(pcm, PCM)
+
+def test_zero_copy_view():
+    wav = bytearray(riff(fmt_pcm(), chunk(b"data", PCM.tobytes())))
+    pcm, _, _ = mp3_io.parse_wav(wav)
+    wav[-2:] = b"\x01\x00"
+    assert pcm[-1, 1] == 1  # view atas buffer upload, bukan salinan
+
+def test_extensible_pcm():
+    pcm, sr, ch = mp3_io.parse_wav(riff(fmt_extensible(), chunk(b"data", PCM.tobytes())))
+    assert (sr, ch) == (48000, 2) and np.array_equal(pcm, PCM)
+    # subformat float (3) bukan PCM integer
+    assert mp3_io.parse_wav(riff(fmt_extensible(sub=3), chunk(b"data", PCM.tobytes()))) is None
+
+def test_odd_sized_chunks_before_data_are_padded():
+    wav = riff(chunk(b"LIST", b"abc"), fmt_pcm(), chunk(b"junk", b"12345"), chunk(b"data", PCM.tobytes()))
+    pcm, _, _ = mp3_io.parse_wav(wav)
+    assert np.array_equal(pcm, PCM)
+
+def test_truncated_data_chunk_uses_what_is_there():
+    full = riff(fmt_pcm(), chunk(b"data", PCM.tobytes()))
+    # potong di tengah frame: sisa byte yang tidak membentuk frame utuh dibuang
+    pcm, _, _ = mp3_io.parse_wav(full[:-7])
+    assert np.array_equal(pcm, PCM[:-2])
+    # ukuran 0 dari writer streaming -> sisa buffer
+    streamed = riff(fmt_pcm()) + b"data" + struct.pack("<I", 0) + PCM.tobytes()
+    assert np.array_equal(mp3_io.parse_wav(streamed)[0], PCM)
+
+@pytest.mark.parametrize("bits", [8, 24, 32])
+def test_non_16_bit_is_rejected(bits):
+    assert mp3_io.parse_wav(riff(fmt_pcm(bits=bits), chunk(b"data", bytes(120)))) is None
+    assert mp3_io.parse_wav(riff(fmt_extensible(bits=bits), chunk(b"data", bytes(120)))) is None
+
+def test_not_pcm_wav():
+    assert mp3_io.parse_wav(riff(fmt_pcm(tag=3), chunk(b"data", bytes(8)))) is None  # float
+    assert mp3_io.parse_wav(riff(chunk(b"data", bytes(8)))) is None  # data sebelum fmt
+    assert mp3_io.parse_wav(b"ID3\x03" + bytes(100)) is None
+    assert mp3_io.parse_wav(b"RIFF") is None